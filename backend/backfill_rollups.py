@@ -0,0 +1,18 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from server import backfill_rollups, client
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily analytics rollups from raw collections")
+    parser.add_argument("--start", required=True, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", default=(datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat(), help="Last day to rebuild (YYYY-MM-DD), defaults to yesterday; today is maintained live and never rebuilt")
+    args = parser.parse_args()
+
+    written = await backfill_rollups(args.start, args.end)
+    print(f"✅ Rebuilt {written} rollup rows for {args.start} → {args.end}")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
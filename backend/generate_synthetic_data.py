@@ -0,0 +1,268 @@
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import date, datetime, timezone, timedelta
+from multiprocessing import Pool
+
+from passlib.context import CryptContext
+from pymongo import MongoClient
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+               "Ananya", "Diya", "Aadhya", "Saanvi", "Pari", "Anika", "Navya", "Myra", "Kavya", "Riya"]
+LAST_NAMES = ["Sharma", "Verma", "Patel", "Yadav", "Singh", "Gupta", "Mehta", "Joshi", "Shah", "Desai",
+              "Iyer", "Reddy", "Nair", "Kulkarni", "Chauhan"]
+TIME_SLOTS = [f"{m // 60:02d}:{m % 60:02d}" for m in range(6 * 60, 8 * 60 + 30, 15)]
+# Early slots fill first; demand tails off towards 08:15.
+SLOT_WEIGHTS = [10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
+# Monday..Sunday booking volume relative to a typical weekday.
+WEEKDAY_WEIGHTS = [1.3, 1.1, 1.0, 1.0, 1.0, 0.8, 0.4]
+
+
+def new_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def short_code(rng: random.Random) -> str:
+    return f"{rng.getrandbits(32):08X}"
+
+
+def pick_created_at(rng: random.Random, now: datetime, days: int) -> datetime:
+    """Recent days are busier, and weekdays busier than weekends."""
+    while True:
+        days_ago = int(rng.expovariate(3.0 / days))
+        if days_ago >= days:
+            continue
+        moment = now - timedelta(days=days_ago, seconds=rng.randrange(86400))
+        if rng.random() * max(WEEKDAY_WEIGHTS) <= WEEKDAY_WEIGHTS[moment.weekday()]:
+            return moment
+
+
+def pick_status(rng: random.Random, appointment_date: str, today: str) -> str:
+    if appointment_date < today:
+        return rng.choices(["completed", "confirmed", "cancelled"], weights=[80, 12, 8])[0]
+    return rng.choices(["pending", "confirmed", "cancelled"], weights=[40, 55, 5])[0]
+
+
+def shard_slot_capacity(day: str, slot_index: int, shard: int, workers: int, slot_capacity: int) -> int:
+    """Seats of one slot this shard may fill.
+
+    Every seat of every slot belongs to exactly one shard, so the parallel
+    workers never overbook a slot between them without talking to each other.
+    """
+    base = (date.fromisoformat(day).toordinal() * len(TIME_SLOTS) + slot_index) * slot_capacity
+    return sum(1 for seat in range(slot_capacity) if (base + seat) % workers == shard)
+
+
+def generate_shard(spec):
+    (shard, user_count, mongo_url, db_name, seed, days, batch_size,
+     appointments_per_user, password_hash, catalog, workers, slot_capacity) = spec
+    rng = random.Random(seed + shard)
+    db = MongoClient(mongo_url)[db_name]
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+
+    items = [("test", t) for t in catalog["tests"]] + [("package", p) for p in catalog["packages"]]
+    # Zipf-like popularity: a handful of tests account for most bookings.
+    item_weights = [(4 if kind == "test" else 1) / (rank + 1) for rank, (kind, _) in enumerate(items)]
+    membership_ids = [m["id"] for m in catalog["memberships"]]
+
+    slot_booked = {}
+
+    def pick_slot(day: str, status: str):
+        """Weighted slot with capacity left, trying less popular slots when it is full.
+
+        Cancelled bookings hold no seat; bookings that find every slot full get
+        no slot, like real bookings taken after the slot window.
+        """
+        first = rng.choices(range(len(TIME_SLOTS)), weights=SLOT_WEIGHTS)[0]
+        if status == "cancelled":
+            return TIME_SLOTS[first]
+        for index in [first] + [i for i in range(len(TIME_SLOTS)) if i != first]:
+            booked = slot_booked.get((day, index), 0)
+            if booked < shard_slot_capacity(day, index, shard, workers, slot_capacity):
+                slot_booked[(day, index)] = booked + 1
+                return TIME_SLOTS[index]
+        return None
+
+    batches = {"users": [], "appointments": [], "payments": [], "reports": []}
+    counts = dict.fromkeys(batches, 0)
+
+    def add(collection, doc):
+        batch = batches[collection]
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(collection)
+
+    def flush(collection):
+        batch = batches[collection]
+        if batch:
+            db[collection].insert_many(batch, ordered=False)
+            counts[collection] += len(batch)
+            batch.clear()
+
+    for i in range(user_count):
+        user_id = new_id(rng)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        phone = f"+91 {rng.randrange(6000000000, 9999999999)}"
+        email = f"synthetic{seed}_{shard}_{i}@ambica.test"
+        joined = pick_created_at(rng, now, days)
+        add("users", {
+            "id": user_id,
+            "name": name,
+            "email": email,
+            "phone": phone,
+            "role": "patient",
+            "password": password_hash,
+            "membership_id": rng.choice(membership_ids) if membership_ids and rng.random() < 0.1 else None,
+            "synthetic": True,
+            "created_at": joined.isoformat()
+        })
+
+        for _ in range(1 + round(rng.expovariate(1.0 / max(appointments_per_user - 1, 0.01)))):
+            kind, item = rng.choices(items, weights=item_weights)[0]
+            # Bookings only happen once the account exists.
+            created = pick_created_at(rng, now, max((now - joined).days, 1))
+            if created < joined:
+                created = min(joined + timedelta(minutes=rng.randrange(1, 120)), now)
+            appointment_date = (created + timedelta(days=min(int(rng.expovariate(0.7)), 14))).date().isoformat()
+            status = pick_status(rng, appointment_date, today)
+            payment_mode = "online" if rng.random() < 0.6 else "at_center"
+            paid = status in ("completed", "confirmed") and (payment_mode == "online" or status == "completed")
+            appointment_id = new_id(rng)
+            booking_id = f"AMB{short_code(rng)}"
+            payment_id = f"pay_{short_code(rng)}" if paid and payment_mode == "online" else None
+            order_id = f"order_{short_code(rng)}" if payment_mode == "online" else None
+
+            add("appointments", {
+                "id": appointment_id,
+                "booking_id": booking_id,
+                "user_id": user_id,
+                "user_name": name,
+                "user_email": email,
+                "user_phone": phone,
+                "test_type": kind,
+                "test_id": item["id"],
+                "test_name": item["name"],
+                "date": appointment_date,
+                "time_slot": pick_slot(appointment_date, status),
+                "payment_mode": payment_mode,
+                "payment_status": "completed" if paid else "pending",
+                "payment_id": payment_id,
+                "razorpay_order_id": order_id,
+                "amount": float(item["price"]),
+                "status": status,
+                "report_uploaded": status == "completed",
+                "synthetic": True,
+                "created_at": created.isoformat()
+            })
+
+            if payment_mode == "online":
+                verified = created + timedelta(minutes=rng.randrange(1, 30))
+                add("payments", {
+                    "id": new_id(rng),
+                    "user_id": user_id,
+                    "appointment_id": appointment_id,
+                    "amount": float(item["price"]),
+                    "razorpay_order_id": order_id,
+                    "razorpay_payment_id": payment_id,
+                    "razorpay_signature": None,
+                    "status": "completed" if paid else "pending",
+                    "payment_mode": "online",
+                    "verified_at": verified.isoformat() if paid else None,
+                    "synthetic": True,
+                    "created_at": created.isoformat()
+                })
+
+            if status == "completed":
+                uploaded = datetime.fromisoformat(appointment_date).replace(tzinfo=timezone.utc) + timedelta(hours=rng.randrange(6, 48))
+                file_name = f"{booking_id}_{rng.getrandbits(32):08x}.pdf"
+                add("reports", {
+                    "id": new_id(rng),
+                    "report_id": f"REP{short_code(rng)}",
+                    "patient_id": user_id,
+                    "patient_name": name,
+                    "appointment_id": appointment_id,
+                    "booking_id": booking_id,
+                    "test_name": item["name"],
+                    "file_url": f"/reports/{file_name}",
+                    "file_name": file_name,
+                    "remarks": "",
+                    "status": "ready",
+                    "storage_tier": "hot",
+                    "synthetic": True,
+                    "report_date": uploaded.isoformat(),
+                    "uploaded_at": uploaded.isoformat()
+                })
+
+    for collection in batches:
+        flush(collection)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic users, appointments, payments and reports for scale testing")
+    parser.add_argument("--users", type=int, default=100000, help="Number of patient users to create")
+    parser.add_argument("--appointments-per-user", type=float, default=3.0, help="Mean appointments per user")
+    parser.add_argument("--days", type=int, default=365, help="History window in days")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel generator processes")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many call")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible datasets")
+    parser.add_argument("--slot-capacity", type=int, default=int(os.environ.get('SLOT_CAPACITY', 3)), help="Bookings allowed per time slot, as enforced by the API")
+    parser.add_argument("--password", default="patient123", help="Password shared by every synthetic user")
+    parser.add_argument("--purge", action="store_true", help="Delete previously generated synthetic documents first")
+    args = parser.parse_args()
+
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'ambica_diagnostic')
+    client = MongoClient(mongo_url)
+    db = client[db_name]
+
+    if args.purge:
+        for collection in ("users", "appointments", "payments", "reports"):
+            result = db[collection].delete_many({"synthetic": True})
+            print(f"🧹 Removed {result.deleted_count} synthetic {collection}")
+    elif db.users.find_one({"synthetic": True}, {"_id": 1}):
+        # users.email is not unique, so a second run would duplicate accounts and make logins ambiguous.
+        client.close()
+        raise SystemExit("❌ Synthetic data already exists; rerun with --purge to replace it")
+
+    catalog = {
+        "tests": list(db.tests.find({}, {"_id": 0, "id": 1, "name": 1, "price": 1})),
+        "packages": list(db.packages.find({}, {"_id": 0, "id": 1, "name": 1, "price": 1})),
+        "memberships": list(db.memberships.find({}, {"_id": 0, "id": 1})),
+    }
+    client.close()
+    if not catalog["tests"] and not catalog["packages"]:
+        raise SystemExit("❌ Catalog is empty; seed it first via POST /api/admin/seed-data")
+
+    # bcrypt is deliberately slow, so hash once and share it across every user.
+    password_hash = pwd_context.hash(args.password)
+
+    workers = max(1, min(args.workers, args.users))
+    shards = [args.users // workers + (1 if i < args.users % workers else 0) for i in range(workers)]
+    specs = [
+        (i, size, mongo_url, db_name, args.seed, args.days, args.batch_size,
+         args.appointments_per_user, password_hash, catalog, workers, args.slot_capacity)
+        for i, size in enumerate(shards)
+    ]
+
+    started = time.monotonic()
+    totals = {}
+    with Pool(workers) as pool:
+        for counts in pool.imap_unordered(generate_shard, specs):
+            for collection, count in counts.items():
+                totals[collection] = totals.get(collection, 0) + count
+
+    elapsed = time.monotonic() - started
+    documents = sum(totals.values())
+    print(f"✅ Inserted {documents} documents in {elapsed:.1f}s ({documents / max(elapsed, 1e-9):,.0f} docs/s)")
+    for collection, count in totals.items():
+        print(f"   {collection}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Branded PDF report rendering.
+
+Runs inside the server's process pool, so this module must stay free of
+database and FastAPI imports: worker processes import it on their own.
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+TEMPLATES_DIR = Path(__file__).parent / "report_templates"
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 18 * mm
+ROW_HEIGHT = 7 * mm
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> Dict[str, Any]:
+    """Template settings, read once per worker process."""
+    with open(TEMPLATES_DIR / f"{name}.json") as f:
+        template = json.load(f)
+    template["primary"] = colors.HexColor(template["primary_color"])
+    template["accent"] = colors.HexColor(template["accent_color"])
+    template["abnormal"] = colors.HexColor(template["abnormal_color"])
+    return template
+
+
+@lru_cache(maxsize=None)
+def load_logo(path: Optional[str]) -> Optional[ImageReader]:
+    """Decoded logo image, cached per worker so it is not re-read for every report."""
+    if not path:
+        return None
+    logo_path = Path(path) if Path(path).is_absolute() else TEMPLATES_DIR / path
+    return ImageReader(str(logo_path)) if logo_path.exists() else None
+
+
+def result_flag(result: Dict[str, Any]) -> str:
+    if result.get("flag"):
+        return result["flag"]
+    low, high, value = result.get("reference_low"), result.get("reference_high"), result["value"]
+    if low is not None and value < low:
+        return "L"
+    if high is not None and value > high:
+        return "H"
+    return ""
+
+
+def reference_text(result: Dict[str, Any]) -> str:
+    low, high = result.get("reference_low"), result.get("reference_high")
+    if low is not None and high is not None:
+        return f"{low:g} - {high:g}"
+    if low is not None:
+        return f">= {low:g}"
+    if high is not None:
+        return f"<= {high:g}"
+    return "-"
+
+
+def draw_letterhead(pdf: canvas.Canvas, template: Dict[str, Any]):
+    top = PAGE_HEIGHT - MARGIN
+    logo = load_logo(template.get("logo"))
+    if logo:
+        pdf.drawImage(logo, MARGIN, top - 16 * mm, 16 * mm, 16 * mm, mask="auto")
+    else:
+        pdf.setFillColor(template["primary"])
+        pdf.roundRect(MARGIN, top - 16 * mm, 16 * mm, 16 * mm, 3 * mm, stroke=0, fill=1)
+        pdf.setFillColor(template["accent"])
+        pdf.circle(MARGIN + 15 * mm, top - 15 * mm, 2.5 * mm, stroke=0, fill=1)
+
+    text_x = MARGIN + 21 * mm
+    pdf.setFillColor(template["primary"])
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawString(text_x, top - 7 * mm, template["clinic_name"])
+    pdf.setFillColor(colors.HexColor("#475569"))
+    pdf.setFont("Helvetica", 9)
+    pdf.drawString(text_x, top - 12 * mm, template["tagline"])
+    pdf.drawString(text_x, top - 16 * mm, f"{template['address']}  |  {template['contact']}")
+
+    pdf.setStrokeColor(template["accent"])
+    pdf.setLineWidth(1.5)
+    pdf.line(MARGIN, top - 20 * mm, PAGE_WIDTH - MARGIN, top - 20 * mm)
+
+
+def draw_footer(pdf: canvas.Canvas, template: Dict[str, Any], page: int):
+    pdf.setFillColor(colors.HexColor("#64748B"))
+    pdf.setFont("Helvetica-Oblique", 8)
+    pdf.drawString(MARGIN, MARGIN / 2, template["footer"])
+    pdf.drawRightString(PAGE_WIDTH - MARGIN, MARGIN / 2, f"Page {page}")
+
+
+def render_report_pdf(payload: Dict[str, Any], output_path: str, template_name: str = "default") -> int:
+    """Render one lab report to output_path and return its size in bytes."""
+    template = load_template(template_name)
+    pdf = canvas.Canvas(output_path, pagesize=A4)
+    pdf.setTitle(f"{payload['test_name']} - {payload['patient_name']}")
+    pdf.setAuthor(template["clinic_name"])
+    page = 1
+    draw_letterhead(pdf, template)
+
+    y = PAGE_HEIGHT - MARGIN - 30 * mm
+    details = [
+        ("Patient", payload["patient_name"]),
+        ("Booking ID", payload["booking_id"]),
+        ("Report ID", payload["report_id"]),
+        ("Test", payload["test_name"]),
+        ("Collected on", payload.get("collection_date") or "-"),
+        ("Reported on", payload["report_date"]),
+    ]
+    pdf.setFont("Helvetica", 10)
+    for i, (label, value) in enumerate(details):
+        x = MARGIN if i % 2 == 0 else PAGE_WIDTH / 2
+        pdf.setFillColor(colors.HexColor("#64748B"))
+        pdf.drawString(x, y, f"{label}:")
+        pdf.setFillColor(colors.black)
+        pdf.drawString(x + 25 * mm, y, str(value))
+        if i % 2 == 1:
+            y -= 6 * mm
+    y -= 6 * mm
+
+    columns = [MARGIN, MARGIN + 70 * mm, MARGIN + 100 * mm, MARGIN + 125 * mm, PAGE_WIDTH - MARGIN - 10 * mm]
+    headers = ["Investigation", "Result", "Unit", "Reference range", "Flag"]
+
+    def draw_table_header(top: float) -> float:
+        pdf.setFillColor(template["primary"])
+        pdf.rect(MARGIN, top - 2 * mm, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, stroke=0, fill=1)
+        pdf.setFillColor(colors.white)
+        pdf.setFont("Helvetica-Bold", 10)
+        for x, header in zip(columns, headers):
+            pdf.drawString(x + 2 * mm, top, header)
+        return top - ROW_HEIGHT
+
+    y = draw_table_header(y)
+    for index, result in enumerate(payload.get("results", [])):
+        if y < MARGIN + 30 * mm:
+            draw_footer(pdf, template, page)
+            pdf.showPage()
+            page += 1
+            draw_letterhead(pdf, template)
+            y = draw_table_header(PAGE_HEIGHT - MARGIN - 30 * mm)
+        if index % 2:
+            pdf.setFillColor(colors.HexColor("#F1F5F9"))
+            pdf.rect(MARGIN, y - 2 * mm, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, stroke=0, fill=1)
+        flag = result_flag(result)
+        pdf.setFont("Helvetica-Bold" if flag else "Helvetica", 10)
+        row = [result["analyte"], f"{result['value']:g}", result.get("unit") or "", reference_text(result), flag]
+        for column, (x, cell) in enumerate(zip(columns, row)):
+            pdf.setFillColor(template["abnormal"] if flag and column in (1, 4) else colors.black)
+            pdf.drawString(x + 2 * mm, y, str(cell))
+        y -= ROW_HEIGHT
+
+    if payload.get("remarks"):
+        y -= 6 * mm
+        pdf.setFillColor(template["primary"])
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(MARGIN, y, "Remarks")
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica", 10)
+        text = pdf.beginText(MARGIN, y - 5 * mm)
+        for line in str(payload["remarks"]).splitlines():
+            text.textLine(line)
+        pdf.drawText(text)
+
+    draw_footer(pdf, template, page)
+    pdf.save()
+    return Path(output_path).stat().st_size
@@ -1,19 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request, status, UploadFile, File, Form
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
+from email.message import EmailMessage
 from dotenv import load_dotenv
 import os
+import asyncio
+import smtplib
+import csv
+import gzip
+import hashlib
+import io
+import json
 import logging
+import multiprocessing
+import re
+import time
 import uuid
+import zlib
+import brotli
+import numpy as np
 import razorpay
+import zstandard
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
+from report_renderer import render_report_pdf
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,6 +45,38 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Reads are routed by workload class. Writes, auth and read-your-own-writes
+# flows (a patient's own bookings, payments and reports) stay on `db`, which
+# always reads from the primary. Heavy admin and analytics reads go to
+# secondaries with bounded staleness; against a single-host replica set
+# secondaryPreferred simply falls back to the primary.
+MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90))
+# MongoDB rejects maxStalenessSeconds below 90 (and below heartbeat + idle
+# write period), failing every secondary read at query time; fail at startup instead.
+if MONGO_MAX_STALENESS_SECONDS < 90:
+    raise ValueError(f"MONGO_MAX_STALENESS_SECONDS must be at least 90, got {MONGO_MAX_STALENESS_SECONDS}")
+READ_PREFERENCE_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def workload_read_preference(workload: str):
+    mode = os.environ.get(f'MONGO_READ_PREFERENCE_{workload.upper()}', 'secondaryPreferred')
+    if mode == "primary":
+        return Primary()
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference for {workload}: {mode}")
+    return READ_PREFERENCE_MODES[mode](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+admin_db = client.get_database(os.environ['DB_NAME'], read_preference=workload_read_preference("admin"))
+analytics_db = client.get_database(os.environ['DB_NAME'], read_preference=workload_read_preference("analytics"))
+
+REPORTS_DIR = Path("/app/backend/reports")
+EXPORTS_DIR = REPORTS_DIR / "exports"
+ARCHIVE_DIR = REPORTS_DIR / "archive"
+
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
@@ -31,6 +86,46 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRATION_HOURS = int(os.environ.get('JWT_EXPIRATION_HOURS', 72))
 
+HOME_COLLECTION_FEE = float(os.environ.get('HOME_COLLECTION_FEE', 100))
+CATALOG_CACHE_TTL_SECONDS = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', 60))
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', 60))
+ROLLUP_BACKFILL_BATCH_SIZE = int(os.environ.get('ROLLUP_BACKFILL_BATCH_SIZE', 1000))
+REPORT_ARCHIVE_AFTER_DAYS = int(os.environ.get('REPORT_ARCHIVE_AFTER_DAYS', 180))
+REPORT_ARCHIVE_BATCH_SIZE = int(os.environ.get('REPORT_ARCHIVE_BATCH_SIZE', 100))
+REPORT_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('REPORT_ARCHIVE_INTERVAL_SECONDS', 3600))
+REPORT_ARCHIVE_ZSTD_LEVEL = int(os.environ.get('REPORT_ARCHIVE_ZSTD_LEVEL', 10))
+REPORT_ARCHIVE_LEASE_SECONDS = int(os.environ.get('REPORT_ARCHIVE_LEASE_SECONDS', 900))
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', 200))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', 2))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 100))
+NOTIFICATION_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_CHUNK_SIZE', 20))
+NOTIFICATION_CONCURRENCY = int(os.environ.get('NOTIFICATION_CONCURRENCY', 4))
+NOTIFICATION_POLL_INTERVAL_SECONDS = float(os.environ.get('NOTIFICATION_POLL_INTERVAL_SECONDS', 5))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+NOTIFICATION_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_LEASE_SECONDS', 600))
+NOTIFICATION_RATE_LIMITS = {
+    "email": float(os.environ.get('EMAIL_RATE_PER_SECOND', 10)),
+    "sms": float(os.environ.get('SMS_RATE_PER_SECOND', 5)),
+}
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 1025))
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'false').lower() == 'true'
+SMTP_FROM = os.environ.get('SMTP_FROM', 'Ambica Diagnostic Center <no-reply@ambica.com>')
+SMS_PROVIDER = os.environ.get('SMS_PROVIDER', 'log')
+REPORT_RENDER_WORKERS = int(os.environ.get('REPORT_RENDER_WORKERS', max((os.cpu_count() or 2) - 1, 1)))
+REPORT_TEMPLATE = os.environ.get('REPORT_TEMPLATE', 'default')
+REPORT_GENERATION_LEASE_SECONDS = int(os.environ.get('REPORT_GENERATION_LEASE_SECONDS', 600))
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_THREAD_THRESHOLD = int(os.environ.get('COMPRESSION_THREAD_THRESHOLD', 64 * 1024))
+SLOT_CAPACITY = int(os.environ.get('SLOT_CAPACITY', 3))
+SLOT_INDEX_TTL_SECONDS = int(os.environ.get('SLOT_INDEX_TTL_SECONDS', 30))
+SLOT_SEARCH_MAX_DAYS = int(os.environ.get('SLOT_SEARCH_MAX_DAYS', 30))
+WAITLIST_CLAIM_LEASE_SECONDS = int(os.environ.get('WAITLIST_CLAIM_LEASE_SECONDS', 300))
+
 razorpay_client = razorpay.Client(auth=(
     os.environ.get('RAZORPAY_KEY_ID', 'test'),
     os.environ.get('RAZORPAY_KEY_SECRET', 'test')
@@ -42,6 +137,8 @@ class UserCreate(BaseModel):
     email: EmailStr
     phone: str
     password: str
+    date_of_birth: Optional[str] = None
+    sex: Optional[str] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -54,6 +151,9 @@ class User(BaseModel):
     email: EmailStr
     phone: str
     role: str = "patient"
+    membership_id: Optional[str] = None
+    date_of_birth: Optional[str] = None
+    sex: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Test(BaseModel):
@@ -65,6 +165,7 @@ class Test(BaseModel):
     preparation_instructions: Optional[str] = ""
     home_collection_available: bool = True
     category: Optional[str] = "General"
+    aliases: List[str] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Package(BaseModel):
@@ -100,7 +201,10 @@ class AppointmentCreate(BaseModel):
     date: str
     time_slot: Optional[str] = None
     payment_mode: str
-    amount: float
+    amount: Optional[float] = None
+    address: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class Appointment(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -121,7 +225,34 @@ class Appointment(BaseModel):
     razorpay_order_id: Optional[str] = None
     amount: float
     status: str = "pending"
+    address: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     assigned_technician: Optional[str] = None
+    technician_id: Optional[str] = None
+    visit_order: Optional[int] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class WaitlistEntry(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    user_name: str
+    user_email: str
+    user_phone: str
+    test_type: str
+    test_id: str
+    test_name: str
+    date: str
+    time_slot: Optional[str] = None
+    payment_mode: str
+    address: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    status: str = "waiting"
+    appointment_id: Optional[str] = None
+    claimed_at: Optional[datetime] = None
+    promoted_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Report(BaseModel):
@@ -137,9 +268,32 @@ class Report(BaseModel):
     file_name: str
     remarks: Optional[str] = ""
     status: str = "ready"
+    storage_tier: str = "hot"
+    archive_path: Optional[str] = None
+    archived_at: Optional[datetime] = None
     report_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class QuoteItem(BaseModel):
+    item_type: str
+    item_id: str
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem]
+    home_collection: bool = False
+
+class LabResult(BaseModel):
+    analyte: str
+    value: float
+    unit: Optional[str] = ""
+    reference_low: Optional[float] = None
+    reference_high: Optional[float] = None
+    flag: Optional[str] = None
+
+class LabResultsInput(BaseModel):
+    results: List[LabResult]
+    remarks: Optional[str] = ""
+
 class ReportUpload(BaseModel):
     patient_id: str
     appointment_id: str
@@ -157,8 +311,35 @@ class Payment(BaseModel):
     razorpay_signature: Optional[str] = None
     status: str = "pending"
     payment_mode: str
+    verified_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Technician(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    phone: str
+    base_latitude: float
+    base_longitude: float
+    capacity: int = 20
+    active: bool = True
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ExportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    collection: str
+    format: str = "csv"
+    gzip: bool = False
+    filters: Dict[str, Any] = {}
+    status: str = "queued"
+    rows: int = 0
+    file_name: Optional[str] = None
+    error: Optional[str] = None
+    requested_by: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    completed_at: Optional[datetime] = None
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -193,6 +374,174 @@ async def get_admin_user(current_user: Dict[str, Any] = Depends(get_current_user
     return current_user
 
 
+idempotency_cache: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+idempotency_inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+def idempotency_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode("utf-8")).hexdigest()
+
+def check_idempotency_fingerprint(stored: str, fingerprint: str):
+    if stored != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+
+async def renew_idempotency_lease(key: str, lock_token: str):
+    """Keep extending the lease while the handler runs, so a slow handler is never taken over by a retry."""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+        try:
+            await db.idempotency_keys.update_one(
+                {"key": key, "lock_token": lock_token, "status": "in_progress"},
+                {"$set": {"locked_until": datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+            )
+        except Exception:
+            logger.exception("Failed to renew idempotency lease for %s", key)
+
+async def execute_idempotent(key: str, fingerprint: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+    # created_at is stored as a BSON date (not an ISO string) so the TTL index can expire it.
+    # locked_until leases the key to this execution; if the worker dies mid-request a retry
+    # takes the key over once the lease expires instead of getting 409 until the TTL.
+    now = datetime.now(timezone.utc)
+    lock_token = str(uuid.uuid4())
+    locked_until = now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    try:
+        await db.idempotency_keys.insert_one({
+            "key": key,
+            "fingerprint": fingerprint,
+            "status": "in_progress",
+            "lock_token": lock_token,
+            "locked_until": locked_until,
+            "created_at": now
+        })
+    except DuplicateKeyError:
+        existing = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+        if existing is None:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is being retried, try again")
+        check_idempotency_fingerprint(existing["fingerprint"], fingerprint)
+        if existing["status"] == "completed":
+            return existing["response"]
+        taken = await db.idempotency_keys.find_one_and_update(
+            {"key": key, "status": "in_progress", "locked_until": {"$lt": now}},
+            {"$set": {"lock_token": lock_token, "locked_until": locked_until}}
+        )
+        if taken is None:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress")
+
+    renewer = asyncio.create_task(renew_idempotency_lease(key, lock_token))
+    try:
+        response = jsonable_encoder(await handler())
+    except BaseException:
+        await db.idempotency_keys.delete_one({"key": key, "lock_token": lock_token})
+        raise
+    finally:
+        renewer.cancel()
+
+    await db.idempotency_keys.update_one(
+        {"key": key, "lock_token": lock_token},
+        {"$set": {"status": "completed", "response": response}, "$unset": {"locked_until": ""}}
+    )
+    return response
+
+async def run_idempotent(scope: str, user_id: str, idempotency_key: Optional[str], payload: Any, handler: Callable[[], Awaitable[Any]]) -> Any:
+    """Run handler at most once per (scope, user, Idempotency-Key).
+
+    Completed responses are replayed from an in-process LRU cache backed by
+    the TTL-indexed idempotency_keys collection. Concurrent duplicates in this
+    process await the first execution; duplicates racing in another worker
+    get a 409 until the first one completes.
+    """
+    if not idempotency_key:
+        return await handler()
+
+    key = f"{scope}:{user_id}:{idempotency_key}"
+    fingerprint = idempotency_fingerprint(payload)
+
+    cached = idempotency_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        check_idempotency_fingerprint(cached[1], fingerprint)
+        idempotency_cache.move_to_end(key)
+        return cached[2]
+
+    inflight = idempotency_inflight.get(key)
+    if inflight:
+        check_idempotency_fingerprint(inflight[0], fingerprint)
+        return await asyncio.shield(inflight[1])
+
+    future = asyncio.get_running_loop().create_future()
+    # Mark the outcome as retrieved so a failure with no waiters is not logged as unhandled.
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    idempotency_inflight[key] = (fingerprint, future)
+    try:
+        response = await execute_idempotent(key, fingerprint, handler)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        idempotency_inflight.pop(key, None)
+
+    future.set_result(response)
+    idempotency_cache[key] = (time.monotonic() + IDEMPOTENCY_TTL_SECONDS, fingerprint, response)
+    if len(idempotency_cache) > IDEMPOTENCY_CACHE_SIZE:
+        idempotency_cache.popitem(last=False)
+    return response
+
+
+audit_buffer: List[Dict[str, Any]] = []
+audit_flush_lock = asyncio.Lock()
+audit_flush_task: Dict[str, Optional[asyncio.Task]] = {"task": None}
+
+def audit_diff(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    before, after = before or {}, after or {}
+    return {
+        field: {"before": before.get(field), "after": after.get(field)}
+        for field in sorted(set(before) | set(after))
+        if before.get(field) != after.get(field)
+    }
+
+def record_audit(actor: Dict[str, Any], action: str, collection: str, document_id: Optional[str], changes: Dict[str, Any], details: Optional[Dict[str, Any]] = None):
+    """Queue an audit entry; it reaches MongoDB on the next size or time based flush."""
+    audit_buffer.append({
+        "id": str(uuid.uuid4()),
+        "actor_id": actor["id"],
+        "actor_email": actor.get("email"),
+        "action": action,
+        "collection": collection,
+        "document_id": document_id,
+        "changes": jsonable_encoder(changes),
+        "details": jsonable_encoder(details or {}),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    })
+    pending = audit_flush_task["task"]
+    if len(audit_buffer) >= AUDIT_FLUSH_SIZE and (pending is None or pending.done()):
+        task = asyncio.create_task(flush_audit_log())
+        audit_flush_task["task"] = task
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+async def flush_audit_log():
+    async with audit_flush_lock:
+        if not audit_buffer:
+            return
+        entries = audit_buffer[:]
+        del audit_buffer[:len(entries)]
+        try:
+            await db.audit_log.insert_many(entries, ordered=False)
+        except asyncio.CancelledError:
+            audit_buffer[:0] = entries
+            raise
+        except Exception:
+            # Put the batch back so the next flush (or shutdown) retries it.
+            logger.exception("Failed to flush %d audit entries", len(entries))
+            audit_buffer[:0] = entries
+
+async def audit_flusher_loop():
+    while True:
+        await asyncio.sleep(AUDIT_FLUSH_INTERVAL_SECONDS)
+        await flush_audit_log()
+
+
 @api_router.get("/")
 async def root():
     return {"message": "Ambica Diagnostic Center API", "status": "active"}
@@ -208,6 +557,8 @@ async def register(user_data: UserCreate):
         name=user_data.name,
         email=user_data.email,
         phone=user_data.phone,
+        date_of_birth=user_data.date_of_birth,
+        sex=user_data.sex,
         role="patient"
     )
     user_doc = user.model_dump()
@@ -236,115 +587,652 @@ async def get_me(current_user: Dict[str, Any] = Depends(get_current_user)):
     return current_user
 
 
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "text/")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring br on ties."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    candidates = [(weights.get(c, weights.get("*", 0.0)), c) for c in ("br", "gzip")]
+    quality, coding = max(candidates, key=lambda c: c[0])
+    return coding if quality > 0 else None
+
+def compress_body(body: bytes, encoding: str, precompute: bool = False) -> bytes:
+    # Precomputed payloads are built once per catalog version, so they can afford maximum effort.
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if precompute else 5)
+    return gzip.compress(body, compresslevel=9 if precompute else 6)
+
+class CompressionMiddleware:
+    """Negotiate br/gzip for buffered responses.
+
+    Streaming responses, bodies below COMPRESSION_MIN_SIZE, non-text content
+    and responses that already carry a Content-Encoding pass through
+    untouched. Bodies above COMPRESSION_THREAD_THRESHOLD are compressed in
+    the default thread pool so the event loop keeps serving requests.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, thread_threshold: int = COMPRESSION_THREAD_THRESHOLD):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        pending_start = None
+
+        async def send_compressed(message):
+            nonlocal pending_start
+            if message["type"] == "http.response.start":
+                pending_start = message
+                return
+            if message["type"] != "http.response.body" or pending_start is None:
+                await send(message)
+                return
+
+            start, pending_start = pending_start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= self.thread_threshold:
+                compressed = await asyncio.to_thread(compress_body, body, encoding)
+            else:
+                compressed = compress_body(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+def precompress_variants(body: bytes) -> Dict[str, bytes]:
+    return {"identity": body, "br": compress_body(body, "br", precompute=True), "gzip": compress_body(body, "gzip", precompute=True)}
+
+async def catalog_response(request: Request, catalog: Dict[str, Any], key: Tuple[str, Optional[str]], items: List[Dict[str, Any]]) -> Response:
+    """Serve a catalog listing from bytes encoded once per catalog version.
+
+    items must come from the same catalog snapshot, so payloads are never
+    cached under a version they were not built from.
+    """
+    variants = catalog["payloads"].get(key)
+    if variants is None:
+        body = json.dumps(jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(body) >= COMPRESSION_MIN_SIZE:
+            variants = await asyncio.to_thread(precompress_variants, body)
+        else:
+            variants = {"identity": body}
+        catalog["payloads"][key] = variants
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding in variants:
+        headers["Content-Encoding"] = encoding
+    else:
+        encoding = "identity"
+    return Response(content=variants[encoding], media_type="application/json", headers=headers)
+
+
+catalog_cache: Dict[str, Any] = {"version": 0, "data": None, "loaded_at": 0.0}
+catalog_lock = asyncio.Lock()
+
+def invalidate_catalog():
+    catalog_cache["version"] += 1
+
+def catalog_is_fresh() -> bool:
+    data = catalog_cache["data"]
+    return (
+        data is not None
+        and data["version"] == catalog_cache["version"]
+        and time.monotonic() - catalog_cache["loaded_at"] < CATALOG_CACHE_TTL_SECONDS
+    )
+
+def build_price_tables(tests: Dict[str, Any], packages: Dict[str, Any], memberships: Dict[str, Any]) -> Dict[str, Any]:
+    """Precompute the effective price of every catalog item per membership.
+
+    The key "" holds the non-member table.
+    """
+    plans = {"": {"discount_percentage": 0, "free_home_collection": False}, **memberships}
+    tables = {}
+    for membership_id, plan in plans.items():
+        factor = 1 - float(plan.get("discount_percentage") or 0) / 100
+        tables[membership_id] = {
+            "test": {item_id: round(float(item["price"]) * factor, 2) for item_id, item in tests.items()},
+            "package": {item_id: round(float(item["price"]) * factor, 2) for item_id, item in packages.items()},
+            "home_collection_fee": 0.0 if plan.get("free_home_collection") else HOME_COLLECTION_FEE,
+        }
+    return tables
+
+GENERIC_TEST_WORDS = {"test", "tests", "profile", "panel", "level", "levels", "screen", "screening"}
+
+def normalize_test_name(name: str) -> str:
+    name = name.lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name).split())
+
+def strip_generic_words(key: str) -> str:
+    words = key.split()
+    while len(words) > 1 and words[-1] in GENERIC_TEST_WORDS:
+        words.pop()
+    return " ".join(words)
+
+def build_test_alias_index(tests: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Map normalized names and aliases to test ids.
+
+    Full names, names without their parenthetical and admin-entered aliases
+    are exact keys. Acronyms in parentheses ("(CBC)") and names without a
+    generic suffix ("Thyroid Profile" -> "thyroid") are derived keys that
+    never override an exact one. A key claimed by two tests at the same level
+    maps to None so it is reported as unresolved rather than guessed.
+    """
+    exact: Dict[str, set] = {}
+    derived: Dict[str, set] = {}
+    for test_id, test in tests.items():
+        name = test.get("name") or ""
+        base = normalize_test_name(re.sub(r"\([^)]*\)", " ", name))
+        keys = {normalize_test_name(name), base}
+        keys.update(normalize_test_name(alias) for alias in test.get("aliases") or [])
+        for key in keys - {""}:
+            exact.setdefault(key, set()).add(test_id)
+        extra = {strip_generic_words(key) for key in keys}
+        extra.update(
+            normalize_test_name(acronym) for acronym in re.findall(r"\(([^)]*)\)", name)
+            if re.fullmatch(r"[A-Z0-9][A-Za-z0-9-]*", acronym.strip()) and any(c.isupper() or c.isdigit() for c in acronym[1:])
+        )
+        for key in extra - set(exact) - {""}:
+            derived.setdefault(key, set()).add(test_id)
+
+    index = {key: next(iter(ids)) if len(ids) == 1 else None for key, ids in derived.items() if key not in exact}
+    index.update({key: next(iter(ids)) if len(ids) == 1 else None for key, ids in exact.items()})
+    return index
+
+def resolve_package_tests(package: Dict[str, Any], alias_index: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    items, keys = [], set()
+    for label in package.get("included_tests") or []:
+        key = normalize_test_name(label)
+        candidates = [key, strip_generic_words(key)]
+        keys.update(candidates)
+        test_id = next((alias_index[k] for k in candidates if alias_index.get(k)), None)
+        items.append({"label": label, "test_id": test_id})
+    return {"included_tests": tuple(package.get("included_tests") or []), "keys": keys, "items": items}
+
+def build_package_composition(
+    packages: Dict[str, Any],
+    alias_index: Dict[str, Optional[str]],
+    previous: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Resolve every package's included_tests, reusing the previous resolution where nothing it read changed.
+
+    A package is only re-resolved when its own included_tests changed or one
+    of the alias keys it looked up now maps differently, so editing one test
+    or package does not re-match the whole catalog.
+    """
+    if previous:
+        old_index, old_composition = previous["test_aliases"], previous["package_composition"]
+        changed = {k for k in old_index.keys() | alias_index.keys() if old_index.get(k) != alias_index.get(k)}
+    else:
+        old_composition, changed = {}, set()
+    composition = {}
+    for package_id, package in packages.items():
+        cached = old_composition.get(package_id)
+        if (
+            cached
+            and cached["included_tests"] == tuple(package.get("included_tests") or [])
+            and not cached["keys"] & changed
+        ):
+            composition[package_id] = cached
+        else:
+            composition[package_id] = resolve_package_tests(package, alias_index)
+    return composition
+
+def expand_package(package: Dict[str, Any], composition: Dict[str, Any], tests: Dict[str, Any]) -> Dict[str, Any]:
+    """Package with its resolved tests and savings against booking those tests separately.
+
+    Savings only count tests that resolved; unresolved names are listed so
+    admins can add aliases for them.
+    """
+    included, unresolved, seen = [], [], set()
+    for item in composition["items"]:
+        test = tests.get(item["test_id"]) if item["test_id"] else None
+        if test is None:
+            unresolved.append(item["label"])
+            continue
+        if test["id"] in seen:
+            continue
+        seen.add(test["id"])
+        included.append({
+            "label": item["label"],
+            "test_id": test["id"],
+            "name": test["name"],
+            "category": test.get("category"),
+            "price": float(test["price"]),
+            "preparation_instructions": test.get("preparation_instructions"),
+            "home_collection_available": test.get("home_collection_available", True)
+        })
+    individual_total = round(sum(t["price"] for t in included), 2)
+    savings = round(max(individual_total - float(package["price"]), 0), 2)
+    return {
+        **package,
+        "tests": included,
+        "unresolved_tests": unresolved,
+        "individual_total": individual_total,
+        "savings": savings,
+        "savings_percentage": round(savings / individual_total * 100, 1) if individual_total else 0.0
+    }
+
+async def get_catalog() -> Dict[str, Any]:
+    """Return the cached catalog, reloading it after invalidation or TTL expiry.
+
+    Invalidation is local to this process; the TTL bounds how long other
+    workers can serve a stale catalog. A reload that finds the same content
+    keeps the previous snapshot, so encoded payloads survive TTL expiry and
+    are only rebuilt when the catalog actually changes.
+    """
+    if catalog_is_fresh():
+        return catalog_cache["data"]
+    async with catalog_lock:
+        if catalog_is_fresh():
+            return catalog_cache["data"]
+        version = catalog_cache["version"]
+        tests, packages, memberships = await asyncio.gather(
+            db.tests.find({}, {"_id": 0}).to_list(None),
+            db.packages.find({}, {"_id": 0}).to_list(None),
+            db.memberships.find({}, {"_id": 0}).to_list(None),
+        )
+        content_hash = hashlib.sha256(
+            json.dumps([tests, packages, memberships], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        previous = catalog_cache["data"]
+        if previous is not None and previous["content_hash"] == content_hash:
+            previous["version"] = version
+            catalog_cache["loaded_at"] = time.monotonic()
+            return previous
+        data = {
+            "version": version,
+            "tests": {t["id"]: t for t in tests},
+            "packages": {p["id"]: p for p in packages},
+            "memberships": {m["id"]: m for m in memberships},
+            "categories": {t.get("category") for t in tests},
+            "content_hash": content_hash,
+            "payloads": {},
+        }
+        data["price_tables"] = build_price_tables(data["tests"], data["packages"], data["memberships"])
+        data["test_aliases"] = build_test_alias_index(data["tests"])
+        data["package_composition"] = build_package_composition(data["packages"], data["test_aliases"], catalog_cache["data"])
+        data["expanded_packages"] = {
+            package_id: expand_package(package, data["package_composition"][package_id], data["tests"])
+            for package_id, package in data["packages"].items()
+        }
+        catalog_cache["data"] = data
+        catalog_cache["loaded_at"] = time.monotonic()
+        return data
+
+def quote_items(catalog: Dict[str, Any], membership_id: Optional[str], items: List[QuoteItem], home_collection: bool) -> Dict[str, Any]:
+    tables = catalog["price_tables"]
+    table = tables.get(membership_id or "", tables[""])
+    base = tables[""]
+    catalogs = {"test": catalog["tests"], "package": catalog["packages"]}
+
+    lines = []
+    for item in items:
+        if item.item_type not in catalogs:
+            raise HTTPException(status_code=400, detail=f"Unknown item type: {item.item_type}")
+        if item.item_id not in table[item.item_type]:
+            raise HTTPException(status_code=400, detail=f"Unknown {item.item_type}: {item.item_id}")
+        lines.append({
+            "item_type": item.item_type,
+            "item_id": item.item_id,
+            "name": catalogs[item.item_type][item.item_id]["name"],
+            "list_price": base[item.item_type][item.item_id],
+            "price": table[item.item_type][item.item_id],
+        })
+
+    subtotal = round(sum(line["list_price"] for line in lines), 2)
+    items_total = round(sum(line["price"] for line in lines), 2)
+    home_collection_fee = table["home_collection_fee"] if home_collection else 0.0
+    return {
+        "items": lines,
+        "subtotal": subtotal,
+        "discount": round(subtotal - items_total, 2),
+        "home_collection_fee": home_collection_fee,
+        "total": round(items_total + home_collection_fee, 2),
+        "membership_id": membership_id if membership_id in catalog["memberships"] else None,
+        "catalog_version": catalog["version"],
+    }
+
+
+@api_router.post("/pricing/quote")
+async def get_price_quote(quote_request: QuoteRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+    catalog = await get_catalog()
+    return quote_items(catalog, current_user.get("membership_id"), quote_request.items, quote_request.home_collection)
+
+
 @api_router.get("/tests")
-async def get_tests(category: Optional[str] = None):
-    query = {} if not category else {"category": category}
-    tests = await db.tests.find(query, {"_id": 0}).to_list(1000)
-    return tests
+async def get_tests(request: Request, category: Optional[str] = None):
+    catalog = await get_catalog()
+    if category and category not in catalog["categories"]:
+        # Unknown categories are not cached, so arbitrary values cannot grow the payload cache.
+        return []
+    tests = [t for t in catalog["tests"].values() if not category or t.get("category") == category]
+    return await catalog_response(request, catalog, ("tests", category), tests)
 
 
 @api_router.post("/tests")
 async def create_test(test: Test, admin: Dict[str, Any] = Depends(get_admin_user)):
     test_doc = test.model_dump()
     test_doc["created_at"] = test_doc["created_at"].isoformat()
+    changes = audit_diff(None, test_doc)
     await db.tests.insert_one(test_doc)
+    invalidate_catalog()
+    record_audit(admin, "create", "tests", test.id, changes)
     return {"message": "Test created successfully", "test": test}
 
 
 @api_router.put("/tests/{test_id}")
 async def update_test(test_id: str, test_data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.tests.update_one({"id": test_id}, {"$set": test_data})
+    before = await db.tests.find_one_and_update(
+        {"id": test_id}, {"$set": test_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    invalidate_catalog()
+    if before:
+        record_audit(admin, "update", "tests", test_id, audit_diff(before, {**before, **test_data}))
     return {"message": "Test updated successfully"}
 
 
 @api_router.delete("/tests/{test_id}")
 async def delete_test(test_id: str, admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.tests.delete_one({"id": test_id})
+    deleted = await db.tests.find_one_and_delete({"id": test_id}, projection={"_id": 0})
+    invalidate_catalog()
+    if deleted:
+        record_audit(admin, "delete", "tests", test_id, audit_diff(deleted, None))
     return {"message": "Test deleted successfully"}
 
 
 @api_router.get("/packages")
-async def get_packages():
-    packages = await db.packages.find({}, {"_id": 0}).to_list(1000)
-    return packages
+async def get_packages(request: Request):
+    catalog = await get_catalog()
+    return await catalog_response(request, catalog, ("packages", None), list(catalog["packages"].values()))
+
+
+@api_router.get("/packages/expanded")
+async def get_expanded_packages(request: Request):
+    """Packages with included tests resolved to catalog tests and their savings."""
+    catalog = await get_catalog()
+    return await catalog_response(request, catalog, ("packages", "expanded"), list(catalog["expanded_packages"].values()))
+
+
+@api_router.get("/packages/{package_id}/expanded")
+async def get_expanded_package(package_id: str):
+    catalog = await get_catalog()
+    package = catalog["expanded_packages"].get(package_id)
+    if not package:
+        raise HTTPException(status_code=404, detail="Package not found")
+    return package
 
 
 @api_router.post("/packages")
 async def create_package(package: Package, admin: Dict[str, Any] = Depends(get_admin_user)):
     package_doc = package.model_dump()
     package_doc["created_at"] = package_doc["created_at"].isoformat()
+    changes = audit_diff(None, package_doc)
     await db.packages.insert_one(package_doc)
+    invalidate_catalog()
+    record_audit(admin, "create", "packages", package.id, changes)
     return {"message": "Package created successfully", "package": package}
 
 
 @api_router.put("/packages/{package_id}")
 async def update_package(package_id: str, package_data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.packages.update_one({"id": package_id}, {"$set": package_data})
+    before = await db.packages.find_one_and_update(
+        {"id": package_id}, {"$set": package_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    invalidate_catalog()
+    if before:
+        record_audit(admin, "update", "packages", package_id, audit_diff(before, {**before, **package_data}))
     return {"message": "Package updated successfully"}
 
 
 @api_router.delete("/packages/{package_id}")
 async def delete_package(package_id: str, admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.packages.delete_one({"id": package_id})
+    deleted = await db.packages.find_one_and_delete({"id": package_id}, projection={"_id": 0})
+    invalidate_catalog()
+    if deleted:
+        record_audit(admin, "delete", "packages", package_id, audit_diff(deleted, None))
     return {"message": "Package deleted successfully"}
 
 
 @api_router.get("/memberships")
-async def get_memberships():
-    memberships = await db.memberships.find({}, {"_id": 0}).to_list(1000)
-    return memberships
+async def get_memberships(request: Request):
+    catalog = await get_catalog()
+    return await catalog_response(request, catalog, ("memberships", None), list(catalog["memberships"].values()))
 
 
 @api_router.post("/memberships")
 async def create_membership(membership: Membership, admin: Dict[str, Any] = Depends(get_admin_user)):
     membership_doc = membership.model_dump()
     membership_doc["created_at"] = membership_doc["created_at"].isoformat()
+    changes = audit_diff(None, membership_doc)
     await db.memberships.insert_one(membership_doc)
+    invalidate_catalog()
+    record_audit(admin, "create", "memberships", membership.id, changes)
     return {"message": "Membership created successfully", "membership": membership}
 
 
 @api_router.put("/memberships/{membership_id}")
 async def update_membership(membership_id: str, membership_data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.memberships.update_one({"id": membership_id}, {"$set": membership_data})
+    before = await db.memberships.find_one_and_update(
+        {"id": membership_id}, {"$set": membership_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    invalidate_catalog()
+    if before:
+        record_audit(admin, "update", "memberships", membership_id, audit_diff(before, {**before, **membership_data}))
     return {"message": "Membership updated successfully"}
 
 
 @api_router.delete("/memberships/{membership_id}")
 async def delete_membership(membership_id: str, admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.memberships.delete_one({"id": membership_id})
+    deleted = await db.memberships.find_one_and_delete({"id": membership_id}, projection={"_id": 0})
+    invalidate_catalog()
+    if deleted:
+        record_audit(admin, "delete", "memberships", membership_id, audit_diff(deleted, None))
     return {"message": "Membership deleted successfully"}
 
 
+SLOT_START_MINUTES = 6 * 60
+SLOT_END_MINUTES = 8 * 60 + 30
+SLOT_INTERVAL_MINUTES = 15
+SLOT_TIMES = [f"{m // 60:02d}:{m % 60:02d}" for m in range(SLOT_START_MINUTES, SLOT_END_MINUTES, SLOT_INTERVAL_MINUTES)]
+SLOT_POSITIONS = {t: i for i, t in enumerate(SLOT_TIMES)}
+
+# date -> {"booked": per-slot counts, "free": bitmap with bit i set while SLOT_TIMES[i] has capacity, "loaded_at"}
+slot_index: Dict[str, Dict[str, Any]] = {}
+
+def parse_slot_date(date: str):
+    try:
+        parsed = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        parsed = None
+    if parsed is None or parsed.isoformat() != date:
+        raise HTTPException(status_code=400, detail="Date must be YYYY-MM-DD")
+    return parsed
+
+def slot_position_after(time_str: Optional[str]) -> int:
+    """Index of the first slot starting at or after HH:MM."""
+    if not time_str:
+        return 0
+    try:
+        hours, mins = (int(part) for part in time_str.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Time must be HH:MM")
+    offset = hours * 60 + mins - SLOT_START_MINUTES
+    return max(0, -(-offset // SLOT_INTERVAL_MINUTES))
+
+def index_slot_doc(doc: Dict[str, Any]):
+    booked = [int(doc.get("booked", {}).get(t, 0)) for t in SLOT_TIMES]
+    free = 0
+    for position, count in enumerate(booked):
+        if count < SLOT_CAPACITY:
+            free |= 1 << position
+    slot_index[doc["date"]] = {"booked": booked, "free": free, "loaded_at": time.monotonic()}
+
+async def load_slot_index(dates: List[str]):
+    """Make sure every date has a fresh bitmap, reading all stale dates in one query.
+
+    slot_availability holds one counter document per date and is the source
+    of truth; dates without one are seeded from their existing appointments.
+    """
+    now = time.monotonic()
+    stale = [d for d in dates if d not in slot_index or now - slot_index[d]["loaded_at"] >= SLOT_INDEX_TTL_SECONDS]
+    if not stale:
+        return
+    for date in [d for d, entry in slot_index.items() if now - entry["loaded_at"] >= SLOT_INDEX_TTL_SECONDS]:
+        del slot_index[date]
+
+    docs = await db.slot_availability.find({"date": {"$in": stale}}, {"_id": 0}).to_list(None)
+    missing = set(stale) - {doc["date"] for doc in docs}
+    if missing:
+        counts = {date: dict.fromkeys(SLOT_TIMES, 0) for date in missing}
+        async for row in db.appointments.aggregate([
+            {"$match": {"date": {"$in": list(missing)}, "time_slot": {"$in": SLOT_TIMES}, "status": {"$ne": "cancelled"}}},
+            {"$group": {"_id": {"date": "$date", "time_slot": "$time_slot"}, "count": {"$sum": 1}}}
+        ]):
+            counts[row["_id"]["date"]][row["_id"]["time_slot"]] = row["count"]
+        for date, booked in counts.items():
+            try:
+                await db.slot_availability.update_one(
+                    {"date": date}, {"$setOnInsert": {"date": date, "booked": booked}}, upsert=True
+                )
+            except DuplicateKeyError:
+                pass
+        # Another worker may have seeded (and booked into) a date first, so re-read instead of trusting counts.
+        docs += await db.slot_availability.find({"date": {"$in": list(missing)}}, {"_id": 0}).to_list(None)
+    for doc in docs:
+        index_slot_doc(doc)
+
+async def reserve_slot(date: str, time_slot: str, force: bool = False) -> bool:
+    """Atomically take one seat in a slot; force skips the capacity check for admin overrides."""
+    if time_slot not in SLOT_POSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid time slot: {time_slot}")
+    parse_slot_date(date)
+    await load_slot_index([date])
+    query = {"date": date}
+    if not force:
+        query[f"booked.{time_slot}"] = {"$lt": SLOT_CAPACITY}
+    doc = await db.slot_availability.find_one_and_update(
+        query, {"$inc": {f"booked.{time_slot}": 1}}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if doc:
+        index_slot_doc(doc)
+        return True
+    slot_index[date]["free"] &= ~(1 << SLOT_POSITIONS[time_slot])
+    return False
+
+async def release_slot(date: str, time_slot: str):
+    if time_slot not in SLOT_POSITIONS:
+        return
+    await load_slot_index([date])
+    doc = await db.slot_availability.find_one_and_update(
+        {"date": date, f"booked.{time_slot}": {"$gt": 0}},
+        {"$inc": {f"booked.{time_slot}": -1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc:
+        index_slot_doc(doc)
+
+def next_free_slots(date: str, start: int, count: int) -> List[str]:
+    """Up to count free slots on an indexed date from position start, lowest set bits first."""
+    free = slot_index[date]["free"] & ~((1 << start) - 1)
+    slots = []
+    while free and len(slots) < count:
+        lowest = free & -free
+        slots.append(SLOT_TIMES[lowest.bit_length() - 1])
+        free ^= lowest
+    return slots
+
+
 @api_router.get("/appointments/slots")
 async def get_available_slots(date: str):
-    slots = []
-    start_time = 6 * 60
-    end_time = 8 * 60 + 30
-    interval = 15
-    
-    for minutes in range(start_time, end_time, interval):
-        hours = minutes // 60
-        mins = minutes % 60
-        time_str = f"{hours:02d}:{mins:02d}"
-        
-        booked = await db.appointments.count_documents({
-            "date": date,
-            "time_slot": time_str,
-            "status": {"$ne": "cancelled"}
-        })
-        
-        slots.append({
+    parse_slot_date(date)
+    await load_slot_index([date])
+    entry = slot_index[date]
+    slots = [
+        {
             "time": time_str,
-            "available": booked < 3
-        })
-    
+            "available": bool(entry["free"] >> position & 1),
+            "remaining": max(SLOT_CAPACITY - entry["booked"][position], 0)
+        }
+        for position, time_str in enumerate(SLOT_TIMES)
+    ]
     return {"slots": slots, "date": date}
 
 
+@api_router.get("/appointments/slots/next")
+async def get_next_available_slots(date: str, after: Optional[str] = None, count: int = 3, days: int = 7):
+    """The earliest free slots from date/after onwards, searching up to days ahead."""
+    start_date = parse_slot_date(date)
+    count = min(max(count, 1), len(SLOT_TIMES) * SLOT_SEARCH_MAX_DAYS)
+    dates = [(start_date + timedelta(days=i)).isoformat() for i in range(min(max(days, 1), SLOT_SEARCH_MAX_DAYS))]
+    await load_slot_index(dates)
+
+    start = slot_position_after(after)
+    results = []
+    for day in dates:
+        for time_str in next_free_slots(day, start, count - len(results)):
+            results.append({"date": day, "time": time_str, "remaining": SLOT_CAPACITY - slot_index[day]["booked"][SLOT_POSITIONS[time_str]]})
+        if len(results) >= count:
+            break
+        start = 0
+    return {"slots": results, "date": date, "after": after}
+
+
 @api_router.post("/appointments")
-async def create_appointment(appointment_data: AppointmentCreate, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def create_appointment(
+    appointment_data: AppointmentCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        "appointments", current_user["id"], idempotency_key, appointment_data,
+        lambda: book_appointment(appointment_data, current_user)
+    )
+
+
+async def book_appointment(appointment_data: AppointmentCreate, current_user: Dict[str, Any], slot_reserved: bool = False) -> Dict[str, Any]:
+    catalog = await get_catalog()
+    quote = quote_items(
+        catalog,
+        current_user.get("membership_id"),
+        [QuoteItem(item_type=appointment_data.test_type, item_id=appointment_data.test_id)],
+        home_collection=bool(appointment_data.address)
+    )
     appointment = Appointment(
-        **appointment_data.model_dump(),
+        **appointment_data.model_dump(exclude={"amount"}),
+        amount=quote["total"],
         user_id=current_user["id"],
         payment_status="pending",
         status="pending"
@@ -352,34 +1240,403 @@ async def create_appointment(appointment_data: AppointmentCreate, current_user:
     appointment_doc = appointment.model_dump()
     appointment_doc["created_at"] = appointment_doc["created_at"].isoformat()
     
-    await db.appointments.insert_one(appointment_doc)
+    reserve = bool(appointment.time_slot) and not slot_reserved
+    if reserve and not await reserve_slot(appointment.date, appointment.time_slot):
+        raise HTTPException(status_code=409, detail="Selected time slot is full; join the waitlist to be booked when it frees up")
+    try:
+        await db.appointments.insert_one(appointment_doc)
+    except Exception:
+        if reserve:
+            await release_slot(appointment.date, appointment.time_slot)
+        raise
+    await record_rollup(appointment_doc, {"bookings": 1, "booking_amount": appointment.amount})
     return {"message": "Appointment booked successfully", "appointment": appointment, "booking_id": appointment.booking_id}
 
 
+@api_router.post("/appointments/waitlist")
+async def join_waitlist(appointment_data: AppointmentCreate, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Queue for a full date (or one slot on it); leave time_slot empty to accept any slot."""
+    parse_slot_date(appointment_data.date)
+    if appointment_data.time_slot and appointment_data.time_slot not in SLOT_POSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid time slot: {appointment_data.time_slot}")
+    # Price the booking now so a bad item fails here, not silently at promotion time.
+    quote = quote_items(
+        await get_catalog(),
+        current_user.get("membership_id"),
+        [QuoteItem(item_type=appointment_data.test_type, item_id=appointment_data.test_id)],
+        home_collection=bool(appointment_data.address)
+    )
+    entry = WaitlistEntry(**appointment_data.model_dump(exclude={"amount"}), user_id=current_user["id"])
+    entry_doc = entry.model_dump()
+    entry_doc["created_at"] = entry_doc["created_at"].isoformat()
+    await db.waitlist.insert_one(entry_doc)
+    # Capacity may have freed up since the patient saw the date as full.
+    await load_slot_index([entry.date])
+    await promote_waitlist(entry.date, next_free_slots(entry.date, 0, len(SLOT_TIMES)))
+    entry_doc = await db.waitlist.find_one({"id": entry.id}, {"_id": 0})
+    return {"message": "Added to waitlist", "entry": entry_doc, "quote": quote}
+
+
+@api_router.get("/appointments/waitlist")
+async def get_user_waitlist(current_user: Dict[str, Any] = Depends(get_current_user)):
+    return await db.waitlist.find({"user_id": current_user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
+
+
+@api_router.delete("/appointments/waitlist/{entry_id}")
+async def leave_waitlist(entry_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    result = await db.waitlist.update_one(
+        {"id": entry_id, "user_id": current_user["id"], "status": "waiting"},
+        {"$set": {"status": "cancelled"}}
+    )
+    if not result.modified_count:
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+    return {"message": "Removed from waitlist"}
+
+
+async def promote_waitlist(date: str, time_slots: List[str]) -> int:
+    """Book the earliest matching waiters into freed slots.
+
+    The earliest waiter is claimed first and only then is a seat reserved
+    atomically, so a cancellation with nobody waiting costs a single read and
+    never holds a seat a direct booking could take. If the seat is gone the
+    waiter goes back to waiting in the same queue position. Returns the number
+    of waiters promoted.
+    """
+    promoted = 0
+    for time_slot in time_slots:
+        while True:
+            stale_claim = (datetime.now(timezone.utc) - timedelta(seconds=WAITLIST_CLAIM_LEASE_SECONDS)).isoformat()
+            entry = await db.waitlist.find_one_and_update(
+                {
+                    "date": date,
+                    "time_slot": {"$in": [time_slot, None]},
+                    "$or": [{"status": "waiting"}, {"status": "promoting", "claimed_at": {"$lt": stale_claim}}]
+                },
+                {"$set": {"status": "promoting", "claimed_at": datetime.now(timezone.utc).isoformat()}},
+                projection={"_id": 0},
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not entry:
+                break
+            if not await reserve_slot(date, time_slot):
+                await db.waitlist.update_one(
+                    {"id": entry["id"], "status": "promoting"}, {"$set": {"status": "waiting"}, "$unset": {"claimed_at": ""}}
+                )
+                break
+            try:
+                user = await db.users.find_one({"id": entry["user_id"]}, {"_id": 0, "password": 0})
+                if not user:
+                    raise ValueError("user no longer exists")
+                booking = await book_appointment(
+                    AppointmentCreate(**{**entry, "time_slot": time_slot}), user, slot_reserved=True
+                )
+            except Exception:
+                logger.exception("Failed to promote waitlist entry %s", entry["id"])
+                await release_slot(date, time_slot)
+                await db.waitlist.update_one({"id": entry["id"]}, {"$set": {"status": "failed"}})
+                continue
+            appointment = booking["appointment"]
+            await db.waitlist.update_one({"id": entry["id"]}, {"$set": {
+                "status": "promoted",
+                "appointment_id": appointment.id,
+                "promoted_at": datetime.now(timezone.utc).isoformat()
+            }})
+            await enqueue_notifications(
+                appointment.model_dump(),
+                "waitlist_promoted",
+                f"A slot opened up for your {appointment.test_name} booking",
+                f"Dear {appointment.user_name}, a slot opened up on {date} at {time_slot}. Your {appointment.test_name} "
+                f"appointment is booked (booking {appointment.booking_id})."
+            )
+            promoted += 1
+    return promoted
+
+
 @api_router.get("/appointments")
 async def get_user_appointments(current_user: Dict[str, Any] = Depends(get_current_user)):
     appointments = await db.appointments.find({"user_id": current_user["id"]}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return appointments
 
 
+DASHBOARD_APPOINTMENT_FIELDS = {"_id": 0, "id": 1, "booking_id": 1, "test_name": 1, "date": 1, "time_slot": 1, "status": 1, "payment_status": 1, "amount": 1}
+DASHBOARD_REPORT_FIELDS = {"_id": 0, "id": 1, "report_id": 1, "test_name": 1, "report_date": 1, "status": 1, "file_name": 1}
+DASHBOARD_PAYMENT_FIELDS = {"_id": 0, "id": 1, "appointment_id": 1, "amount": 1, "status": 1, "payment_mode": 1, "created_at": 1}
+
+@api_router.get("/dashboard")
+async def get_dashboard(limit: int = 5, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Everything the patient dashboard needs in one round trip and one auth check."""
+    limit = min(max(limit, 1), 50)
+    user_id = current_user["id"]
+    upcoming = {"user_id": user_id, "status": {"$nin": ["completed", "cancelled"]}}
+    (
+        upcoming_appointments, recent_reports, recent_payments,
+        total_appointments, upcoming_count, pending_reports, total_reports, reports_ready, total_payments
+    ) = await asyncio.gather(
+        db.appointments.find(upcoming, DASHBOARD_APPOINTMENT_FIELDS).sort("created_at", -1).to_list(limit),
+        db.reports.find({"patient_id": user_id}, DASHBOARD_REPORT_FIELDS).sort("report_date", -1).to_list(limit),
+        db.payments.find({"user_id": user_id}, DASHBOARD_PAYMENT_FIELDS).sort("created_at", -1).to_list(limit),
+        db.appointments.count_documents({"user_id": user_id}),
+        db.appointments.count_documents(upcoming),
+        db.appointments.count_documents({"user_id": user_id, "payment_status": "completed", "status": {"$ne": "completed"}}),
+        db.reports.count_documents({"patient_id": user_id}),
+        db.reports.count_documents({"patient_id": user_id, "status": "ready"}),
+        db.payments.count_documents({"user_id": user_id}),
+    )
+    return {
+        "user": current_user,
+        "counts": {
+            "appointments": total_appointments,
+            "upcoming_appointments": upcoming_count,
+            "pending_reports": pending_reports,
+            "reports": total_reports,
+            "reports_ready": reports_ready,
+            "payments": total_payments
+        },
+        "upcoming_appointments": upcoming_appointments,
+        "recent_reports": recent_reports,
+        "recent_payments": recent_payments
+    }
+
+
 @api_router.get("/appointments/all")
 async def get_all_appointments(admin: Dict[str, Any] = Depends(get_admin_user)):
-    appointments = await db.appointments.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    appointments = await admin_db.appointments.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return appointments
 
 
 @api_router.put("/appointments/{appointment_id}")
 async def update_appointment(appointment_id: str, update_data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
-    await db.appointments.update_one({"id": appointment_id}, {"$set": update_data})
+    # Seed the counters for both dates before the write: a date seeded afterwards would
+    # already count the change, and sync_slot_hold would then apply it a second time.
+    if "date" in update_data:
+        parse_slot_date(update_data["date"])
+    current = await db.appointments.find_one({"id": appointment_id}, {"_id": 0, "date": 1})
+    dates = {(current or {}).get("date"), update_data.get("date")} - {None}
+    await load_slot_index(sorted(dates))
+    before = await db.appointments.find_one_and_update(
+        {"id": appointment_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    if before:
+        after = {**before, **update_data}
+        record_audit(admin, "update", "appointments", appointment_id, audit_diff(before, after))
+        await sync_slot_hold(before, after)
     return {"message": "Appointment updated successfully"}
 
 
+def held_slot(appointment: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    if appointment.get("status") == "cancelled" or appointment.get("time_slot") not in SLOT_POSITIONS:
+        return None
+    return appointment["date"], appointment["time_slot"]
+
+async def sync_slot_hold(before: Dict[str, Any], after: Dict[str, Any]):
+    """Move the appointment's seat after a cancel or reschedule and offer the freed one to the waitlist.
+
+    Admin reschedules may overbook, so the new seat is taken without a capacity check.
+    """
+    old, new = held_slot(before), held_slot(after)
+    if old == new:
+        return
+    if new:
+        await reserve_slot(*new, force=True)
+    if old:
+        await release_slot(*old)
+        await promote_waitlist(old[0], [old[1]])
+
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_matrix(src_lat: np.ndarray, src_lng: np.ndarray, dst_lat: np.ndarray, dst_lng: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances in km, shape (len(src), len(dst))."""
+    lat1 = np.radians(src_lat)[:, None]
+    lat2 = np.radians(dst_lat)[None, :]
+    dlat = lat2 - lat1
+    dlng = np.radians(dst_lng)[None, :] - np.radians(src_lng)[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def solve_technician_routes(stops: List[Dict[str, Any]], technicians: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assign stops to technicians and order each technician's visits.
+
+    Stops are assigned in order of regret (how much worse the second-closest
+    technician base is than the closest), so contested stops are placed first
+    while capacity is still available. Each technician's visits are then
+    sequenced slot by slot, nearest-neighbour from the previous position.
+    """
+    n_stops, n_techs = len(stops), len(technicians)
+    if n_stops == 0 or n_techs == 0:
+        return {"routes": {t["id"]: [] for t in technicians}, "distances": {}, "unassigned": list(range(n_stops))}
+
+    stop_lat = np.array([s["latitude"] for s in stops], dtype=float)
+    stop_lng = np.array([s["longitude"] for s in stops], dtype=float)
+    base_lat = np.array([t["base_latitude"] for t in technicians], dtype=float)
+    base_lng = np.array([t["base_longitude"] for t in technicians], dtype=float)
+
+    to_base = haversine_matrix(stop_lat, stop_lng, base_lat, base_lng)
+    between = haversine_matrix(stop_lat, stop_lng, stop_lat, stop_lng)
+
+    preferences = np.argsort(to_base, axis=1)
+    if n_techs > 1:
+        ranked = np.take_along_axis(to_base, preferences[:, :2], axis=1)
+        regret = ranked[:, 1] - ranked[:, 0]
+    else:
+        regret = np.zeros(n_stops)
+
+    remaining = np.array([max(int(t.get("capacity", 0)), 0) for t in technicians])
+    owner = np.full(n_stops, -1)
+    for stop in np.argsort(-regret, kind="stable"):
+        for tech in preferences[stop]:
+            if remaining[tech] > 0:
+                owner[stop] = tech
+                remaining[tech] -= 1
+                break
+
+    slot_keys = np.array([s.get("time_slot") or "99:99" for s in stops])
+    routes: Dict[str, List[int]] = {}
+    distances: Dict[str, float] = {}
+    for tech, technician in enumerate(technicians):
+        assigned = np.flatnonzero(owner == tech)
+        order: List[int] = []
+        travelled = 0.0
+        current = None
+        for slot in np.unique(slot_keys[assigned]):
+            pending = assigned[slot_keys[assigned] == slot]
+            while pending.size:
+                if current is None:
+                    legs = to_base[pending, tech]
+                else:
+                    legs = between[current, pending]
+                nearest = int(np.argmin(legs))
+                travelled += float(legs[nearest])
+                current = int(pending[nearest])
+                order.append(current)
+                pending = np.delete(pending, nearest)
+        routes[technician["id"]] = order
+        distances[technician["id"]] = round(travelled, 2)
+
+    return {"routes": routes, "distances": distances, "unassigned": np.flatnonzero(owner == -1).tolist()}
+
+
+@api_router.post("/admin/technicians")
+async def create_technician(technician: Technician, admin: Dict[str, Any] = Depends(get_admin_user)):
+    technician_doc = technician.model_dump()
+    technician_doc["created_at"] = technician_doc["created_at"].isoformat()
+    changes = audit_diff(None, technician_doc)
+    await db.technicians.insert_one(technician_doc)
+    record_audit(admin, "create", "technicians", technician.id, changes)
+    return {"message": "Technician created successfully", "technician": technician}
+
+
+@api_router.get("/admin/technicians")
+async def get_technicians(admin: Dict[str, Any] = Depends(get_admin_user)):
+    technicians = await admin_db.technicians.find({}, {"_id": 0}).to_list(1000)
+    return technicians
+
+
+@api_router.put("/admin/technicians/{technician_id}")
+async def update_technician(technician_id: str, technician_data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
+    before = await db.technicians.find_one_and_update(
+        {"id": technician_id}, {"$set": technician_data}, projection={"_id": 0}, return_document=ReturnDocument.BEFORE
+    )
+    if before:
+        record_audit(admin, "update", "technicians", technician_id, audit_diff(before, {**before, **technician_data}))
+    return {"message": "Technician updated successfully"}
+
+
+@api_router.post("/admin/technicians/assign")
+async def assign_technicians(date: str, admin: Dict[str, Any] = Depends(get_admin_user)):
+    technicians = await db.technicians.find({"active": True}, {"_id": 0}).to_list(1000)
+    if not technicians:
+        raise HTTPException(status_code=400, detail="No active technicians available")
+
+    stops = await db.appointments.find(
+        {
+            "date": date,
+            "status": "confirmed",
+            "latitude": {"$ne": None},
+            "longitude": {"$ne": None}
+        },
+        {"_id": 0, "id": 1, "booking_id": 1, "time_slot": 1, "latitude": 1, "longitude": 1}
+    ).to_list(None)
+
+    plan = await asyncio.to_thread(solve_technician_routes, stops, technicians)
+
+    operations = []
+    schedule = []
+    for technician in technicians:
+        visits = plan["routes"].get(technician["id"], [])
+        for position, stop_index in enumerate(visits, start=1):
+            operations.append(UpdateOne(
+                {"id": stops[stop_index]["id"]},
+                {"$set": {
+                    "assigned_technician": technician["name"],
+                    "technician_id": technician["id"],
+                    "visit_order": position
+                }}
+            ))
+        schedule.append({
+            "technician_id": technician["id"],
+            "technician_name": technician["name"],
+            "distance_km": plan["distances"].get(technician["id"], 0.0),
+            "visits": [
+                {"booking_id": stops[i]["booking_id"], "time_slot": stops[i].get("time_slot")}
+                for i in visits
+            ]
+        })
+
+    assigned = len(operations)
+    # Stops left out of this plan must not keep a technician from an earlier run.
+    operations.extend(
+        UpdateOne(
+            {"id": stops[stop_index]["id"]},
+            {"$unset": {"assigned_technician": "", "technician_id": "", "visit_order": ""}}
+        )
+        for stop_index in plan["unassigned"]
+    )
+    if operations:
+        await db.appointments.bulk_write(operations, ordered=False)
+    record_audit(admin, "assign", "appointments", None, {}, details={
+        "date": date,
+        "assigned": assigned,
+        "unassigned": [stops[i]["booking_id"] for i in plan["unassigned"]],
+        "routes": {t["technician_id"]: [v["booking_id"] for v in t["visits"]] for t in schedule}
+    })
+
+    return {
+        "date": date,
+        "assigned": assigned,
+        "unassigned": [stops[i]["booking_id"] for i in plan["unassigned"]],
+        "schedule": schedule
+    }
+
+
 @api_router.post("/payments/create-order")
-async def create_payment_order(data: Dict[str, Any], current_user: Dict[str, Any] = Depends(get_current_user)):
+async def create_payment_order(
+    data: Dict[str, Any],
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        "payments", current_user["id"], idempotency_key, data,
+        lambda: create_razorpay_order(data, current_user)
+    )
+
+
+async def create_razorpay_order(data: Dict[str, Any], current_user: Dict[str, Any]) -> Dict[str, Any]:
+    appointment = await db.appointments.find_one(
+        {"id": data.get("appointment_id"), "user_id": current_user["id"]},
+        {"_id": 0, "id": 1, "amount": 1, "payment_status": 1}
+    )
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    if appointment.get("payment_status") == "completed":
+        raise HTTPException(status_code=409, detail="Appointment is already paid")
+    
     try:
-        amount = int(data["amount"] * 100)
+        amount = int(round(appointment["amount"] * 100))
         
-        razor_order = razorpay_client.order.create({
+        # The gateway client is blocking; keep it off the event loop so leases keep renewing meanwhile.
+        razor_order = await asyncio.to_thread(razorpay_client.order.create, {
             "amount": amount,
             "currency": "INR",
             "payment_capture": 1
@@ -387,8 +1644,8 @@ async def create_payment_order(data: Dict[str, Any], current_user: Dict[str, Any
         
         payment = Payment(
             user_id=current_user["id"],
-            appointment_id=data.get("appointment_id", ""),
-            amount=data["amount"],
+            appointment_id=appointment["id"],
+            amount=appointment["amount"],
             razorpay_order_id=razor_order["id"],
             payment_mode="online",
             status="pending"
@@ -417,12 +1674,13 @@ async def verify_payment(data: Dict[str, Any], current_user: Dict[str, Any] = De
             'razorpay_signature': data['razorpay_signature']
         })
         
-        await db.payments.update_one(
-            {"razorpay_order_id": data['razorpay_order_id']},
+        result = await db.payments.update_one(
+            {"razorpay_order_id": data['razorpay_order_id'], "status": {"$ne": "completed"}},
             {"$set": {
                 "razorpay_payment_id": data['razorpay_payment_id'],
                 "razorpay_signature": data['razorpay_signature'],
-                "status": "completed"
+                "status": "completed",
+                "verified_at": datetime.now(timezone.utc).isoformat()
             }}
         )
         
@@ -436,6 +1694,17 @@ async def verify_payment(data: Dict[str, Any], current_user: Dict[str, Any] = De
                     "status": "confirmed"
                 }}
             )
+            if result.modified_count:
+                appointment = await db.appointments.find_one({"id": payment["appointment_id"]}, {"_id": 0})
+                if appointment:
+                    await record_rollup(appointment, {"payments": 1, "revenue": payment["amount"]})
+                    await enqueue_notifications(
+                        appointment,
+                        "payment_confirmed",
+                        f"Payment received for booking {appointment['booking_id']}",
+                        f"Dear {appointment['user_name']}, we have received your payment of Rs. {payment['amount']:.2f} "
+                        f"for {appointment['test_name']} (booking {appointment['booking_id']}). Your appointment is confirmed."
+                    )
         
         return {"message": "Payment verified successfully", "status": "completed"}
     except Exception as e:
@@ -458,7 +1727,7 @@ async def search_patients(query: str, admin: Dict[str, Any] = Depends(get_admin_
         ],
         "status": "confirmed"
     }
-    appointments = await db.appointments.find(search_filter, {"_id": 0}).to_list(100)
+    appointments = await admin_db.appointments.find(search_filter, {"_id": 0}).to_list(100)
     return appointments
 
 
@@ -476,7 +1745,7 @@ async def upload_report(
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
         
-        reports_dir = Path("/app/backend/reports")
+        reports_dir = REPORTS_DIR
         reports_dir.mkdir(exist_ok=True)
         
         file_extension = Path(file.filename).suffix
@@ -502,16 +1771,8 @@ async def upload_report(
             status=status
         )
         
-        report_doc = report.model_dump()
-        report_doc["report_date"] = report_doc["report_date"].isoformat()
-        report_doc["uploaded_at"] = report_doc["uploaded_at"].isoformat()
-        await db.reports.insert_one(report_doc)
-        
-        await db.appointments.update_one(
-            {"id": appointment_id},
-            {"$set": {"status": "completed", "report_uploaded": True}}
-        )
-        
+        await save_report(report, appointment)
+        record_audit(admin, "create", "reports", report.id, audit_diff(None, report.model_dump()))
         return {"message": "Report uploaded successfully", "report": report}
     except HTTPException:
         raise
@@ -519,6 +1780,361 @@ async def upload_report(
         raise HTTPException(status_code=500, detail=f"Report upload failed: {str(e)}")
 
 
+async def save_report(report: Report, appointment: Dict[str, Any]):
+    """Persist a report and mark its appointment completed, whether uploaded or generated."""
+    report_doc = report.model_dump()
+    report_doc["report_date"] = report_doc["report_date"].isoformat()
+    report_doc["uploaded_at"] = report_doc["uploaded_at"].isoformat()
+    await db.reports.insert_one(report_doc)
+    
+    await db.appointments.update_one(
+        {"id": appointment["id"]},
+        {"$set": {"status": "completed", "report_uploaded": True}}
+    )
+    await record_rollup(appointment, {"reports": 1})
+    if appointment.get("lab_results"):
+        await store_patient_results(appointment, report.report_id)
+    if report.status == "ready":
+        await enqueue_notifications(
+            appointment,
+            "report_ready",
+            f"Your {appointment['test_name']} report is ready",
+            f"Dear {appointment['user_name']}, your {appointment['test_name']} report for booking "
+            f"{appointment['booking_id']} is ready. Log in to Ambica Diagnostic Center to download it."
+        )
+
+
+report_render_pool: Dict[str, Optional[ProcessPoolExecutor]] = {"pool": None}
+
+def get_report_render_pool() -> ProcessPoolExecutor:
+    if report_render_pool["pool"] is None:
+        # Spawn rather than fork: a forked worker would inherit this process's Motor
+        # client and event-loop threads instead of importing just report_renderer.
+        report_render_pool["pool"] = ProcessPoolExecutor(
+            max_workers=REPORT_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return report_render_pool["pool"]
+
+async def generate_report(appointment: Dict[str, Any]) -> Report:
+    """Render an appointment's stored lab results to a branded PDF in the process pool.
+
+    The appointment is claimed first with a conditional update, so two calls
+    racing on the same appointment cannot both issue a report. A claim left by
+    a crashed worker expires after REPORT_GENERATION_LEASE_SECONDS.
+    """
+    now = datetime.now(timezone.utc)
+    stale = (now - timedelta(seconds=REPORT_GENERATION_LEASE_SECONDS)).isoformat()
+    claimed = await db.appointments.update_one(
+        {
+            "id": appointment["id"],
+            "report_uploaded": {"$ne": True},
+            "$or": [{"report_generating_at": None}, {"report_generating_at": {"$lt": stale}}]
+        },
+        {"$set": {"report_generating_at": now.isoformat()}}
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="A report has already been issued or is being generated for this appointment")
+    try:
+        return await render_and_save_report(appointment)
+    finally:
+        await db.appointments.update_one({"id": appointment["id"]}, {"$unset": {"report_generating_at": ""}})
+
+async def render_and_save_report(appointment: Dict[str, Any]) -> Report:
+    REPORTS_DIR.mkdir(exist_ok=True)
+    file_name = f"{appointment['booking_id']}_{uuid.uuid4().hex[:8]}.pdf"
+    report = Report(
+        patient_id=appointment["user_id"],
+        patient_name=appointment["user_name"],
+        appointment_id=appointment["id"],
+        booking_id=appointment["booking_id"],
+        test_name=appointment["test_name"],
+        file_url=f"/reports/{file_name}",
+        file_name=file_name,
+        remarks=appointment.get("results_remarks") or "",
+        status="ready"
+    )
+    payload = {
+        "patient_name": report.patient_name,
+        "booking_id": report.booking_id,
+        "report_id": report.report_id,
+        "test_name": report.test_name,
+        "collection_date": appointment.get("date"),
+        "report_date": report.report_date.strftime("%d %b %Y"),
+        "results": appointment["lab_results"],
+        "remarks": report.remarks
+    }
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_report_render_pool(), render_report_pdf, payload, str(REPORTS_DIR / file_name), REPORT_TEMPLATE)
+    await save_report(report, appointment)
+    return report
+
+
+# (analyte, sex, min age inclusive, max age exclusive, low, high). For each
+# analyte, sex-specific rows come before the "*" fallback used when the
+# patient's sex is unknown; the first matching row wins.
+REFERENCE_RANGES = [
+    ("hba1c", "*", 0, 150, 4.0, 5.6),
+    ("fasting_glucose", "*", 0, 150, 70, 99),
+    ("total_cholesterol", "*", 0, 150, None, 200),
+    ("ldl", "*", 0, 150, None, 100),
+    ("hdl", "M", 0, 150, 40, None),
+    ("hdl", "F", 0, 150, 50, None),
+    ("hdl", "*", 0, 150, 40, None),
+    ("triglycerides", "*", 0, 150, None, 150),
+    ("hemoglobin", "M", 18, 150, 13.5, 17.5),
+    ("hemoglobin", "F", 18, 150, 12.0, 15.5),
+    ("hemoglobin", "*", 0, 18, 11.0, 16.0),
+    ("hemoglobin", "*", 18, 150, 12.0, 17.5),
+    ("tsh", "*", 0, 70, 0.4, 4.0),
+    ("tsh", "*", 70, 150, 0.4, 6.0),
+    ("creatinine", "M", 18, 150, 0.74, 1.35),
+    ("creatinine", "F", 18, 150, 0.59, 1.04),
+    ("creatinine", "*", 0, 18, 0.3, 0.9),
+    ("creatinine", "*", 18, 150, 0.59, 1.35),
+    ("vitamin_d", "*", 0, 150, 30, 100),
+    ("alt", "M", 0, 150, 7, 56),
+    ("alt", "F", 0, 150, 7, 45),
+    ("alt", "*", 0, 150, 7, 56),
+]
+RANGE_ANALYTE = np.array([r[0] for r in REFERENCE_RANGES])
+RANGE_SEX = np.array([r[1] for r in REFERENCE_RANGES])
+RANGE_AGE_MIN = np.array([r[2] for r in REFERENCE_RANGES], dtype=float)
+RANGE_AGE_MAX = np.array([r[3] for r in REFERENCE_RANGES], dtype=float)
+RANGE_LOW = np.array([np.nan if r[4] is None else r[4] for r in REFERENCE_RANGES], dtype=float)
+RANGE_HIGH = np.array([np.nan if r[5] is None else r[5] for r in REFERENCE_RANGES], dtype=float)
+ANALYTE_ALIASES = {
+    "ldl_cholesterol": "ldl",
+    "hdl_cholesterol": "hdl",
+    "fasting_blood_sugar": "fasting_glucose",
+    "fbs": "fasting_glucose",
+    "haemoglobin": "hemoglobin",
+    "hb": "hemoglobin",
+    "25_oh_vitamin_d": "vitamin_d",
+    "sgpt": "alt",
+    "serum_creatinine": "creatinine",
+}
+
+def analyte_key(name: str) -> str:
+    key = "".join(c if c.isalnum() else "_" for c in name.lower()).strip("_")
+    while "__" in key:
+        key = key.replace("__", "_")
+    return ANALYTE_ALIASES.get(key, key)
+
+def age_on(date_of_birth: Optional[str], on_date: Optional[str]) -> Optional[float]:
+    if not date_of_birth:
+        return None
+    try:
+        born = datetime.fromisoformat(date_of_birth).date()
+        when = datetime.fromisoformat(on_date).date() if on_date else datetime.now(timezone.utc).date()
+    except ValueError:
+        return None
+    return (when - born).days / 365.25
+
+def evaluate_reference_ranges(keys: List[str], values: np.ndarray, ages: np.ndarray, sexes: List[Optional[str]],
+                              lab_low: np.ndarray, lab_high: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Resolve reference ranges and H/L flags for many results at once.
+
+    Every result is matched against every range row in one boolean matrix.
+    A NaN age is treated as adult (30). Ranges supplied by the lab (non-NaN
+    lab_low/lab_high) take precedence over the built-in table.
+    """
+    ages = np.where(np.isnan(ages), 30.0, ages)
+    sex_codes = np.array([(s or "*").upper()[:1] for s in sexes])
+    match = (
+        (np.asarray(keys)[:, None] == RANGE_ANALYTE[None, :])
+        & ((RANGE_SEX[None, :] == "*") | (RANGE_SEX[None, :] == sex_codes[:, None]))
+        & (RANGE_AGE_MIN[None, :] <= ages[:, None])
+        & (ages[:, None] < RANGE_AGE_MAX[None, :])
+    )
+    found = match.any(axis=1)
+    row = match.argmax(axis=1)
+    low = np.where(np.isnan(lab_low), np.where(found, RANGE_LOW[row], np.nan), lab_low)
+    high = np.where(np.isnan(lab_high), np.where(found, RANGE_HIGH[row], np.nan), lab_high)
+    with np.errstate(invalid="ignore"):
+        flags = np.where(values < low, "L", np.where(values > high, "H", ""))
+    return low, high, flags
+
+def nan_to_none(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+RESULT_COLUMNS = ("t", "v", "flag", "report_id", "appointment_id")
+
+async def store_patient_results(appointment: Dict[str, Any], report_id: Optional[str] = None):
+    """Write an appointment's analyte values into the patient's columnar results document.
+
+    Each analyte keeps parallel arrays (t, v, flag, report_id, appointment_id),
+    so a full history for one analyte is a single projected read. Points are
+    keyed by appointment: saving corrected results or regenerating a report
+    replaces that appointment's points instead of appending duplicates.
+    Points written without a report_id are drafts that patients do not see
+    until a report carrying them is issued. The read-modify-write is guarded
+    by a revision counter; persistent conflicts raise instead of passing
+    silently.
+    """
+    patient_id, appointment_id = appointment["user_id"], appointment["id"]
+    for _ in range(5):
+        doc = await db.patient_results.find_one({"patient_id": patient_id}, {"_id": 0, "analytes": 1, "revision": 1})
+        analytes = (doc or {}).get("analytes") or {}
+
+        for series in analytes.values():
+            length = len(series.get("t", []))
+            for column in RESULT_COLUMNS:
+                series[column] = list(series.get(column) or []) + [None] * (length - len(series.get(column) or []))
+            keep = [i for i, a in enumerate(series["appointment_id"]) if a != appointment_id]
+            for column in RESULT_COLUMNS:
+                series[column] = [series[column][i] for i in keep]
+
+        for result in appointment.get("lab_results") or []:
+            series = analytes.setdefault(analyte_key(result["analyte"]), {column: [] for column in RESULT_COLUMNS})
+            series["name"] = result["analyte"]
+            series["unit"] = result.get("unit") or ""
+            point = (appointment["date"], float(result["value"]), result.get("flag") or "", report_id, appointment_id)
+            for column, value in zip(RESULT_COLUMNS, point):
+                series[column].append(value)
+        analytes = {key: series for key, series in analytes.items() if series["t"]}
+
+        if doc is None:
+            try:
+                await db.patient_results.insert_one({"patient_id": patient_id, "analytes": analytes, "revision": 1})
+                return
+            except DuplicateKeyError:
+                continue
+        revision = doc.get("revision")
+        result = await db.patient_results.update_one(
+            {"patient_id": patient_id, "revision": revision if revision is not None else {"$exists": False}},
+            {"$set": {"analytes": analytes}, "$inc": {"revision": 1}}
+        )
+        if result.matched_count:
+            return
+    raise HTTPException(status_code=409, detail="Patient results are being updated concurrently, please retry")
+
+async def build_result_trends(patient_id: str, analyte: Optional[str], published_only: bool = False) -> Dict[str, Any]:
+    """Per-analyte history; published_only keeps points that belong to an issued report."""
+    projection = {"_id": 0, f"analytes.{analyte_key(analyte)}": 1} if analyte else {"_id": 0, "analytes": 1}
+    doc = await db.patient_results.find_one({"patient_id": patient_id}, projection) or {}
+
+    trends = []
+    for key, series in (doc.get("analytes") or {}).items():
+        report_ids = np.array(series.get("report_id", []), dtype=object)
+        report_ids = np.concatenate([report_ids, np.full(len(series.get("t", [])) - report_ids.size, None, dtype=object)])
+        visible = np.array([not published_only or r is not None for r in report_ids], dtype=bool)
+        if not visible.any():
+            continue
+        dates = np.array(series.get("t", []))[visible]
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        values = np.asarray(series.get("v", []), dtype=float)[visible][order]
+        flags = np.array(series.get("flag", []))[visible][order]
+        report_ids = report_ids[visible][order]
+        deltas = np.diff(values)
+        trends.append({
+            "analyte": series.get("name", key),
+            "key": key,
+            "unit": series.get("unit", ""),
+            "points": [
+                {"date": str(d), "value": float(v), "flag": str(f), "report_id": None if r is None else str(r), "delta": None if i == 0 else float(deltas[i - 1])}
+                for i, (d, v, f, r) in enumerate(zip(dates, values, flags, report_ids))
+            ],
+            "latest": float(values[-1]) if values.size else None,
+            "change_from_previous": float(deltas[-1]) if deltas.size else None,
+            "change_from_first": float(values[-1] - values[0]) if values.size > 1 else None,
+            "min": float(values.min()) if values.size else None,
+            "max": float(values.max()) if values.size else None,
+        })
+    return {"patient_id": patient_id, "trends": trends}
+
+
+@api_router.put("/appointments/{appointment_id}/results")
+async def save_lab_results(appointment_id: str, results: LabResultsInput, admin: Dict[str, Any] = Depends(get_admin_user)):
+    appointment = await db.appointments.find_one(
+        {"id": appointment_id}, {"_id": 0, "user_id": 1, "date": 1, "lab_results": 1, "results_remarks": 1}
+    )
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    patient = await db.users.find_one({"id": appointment["user_id"]}, {"_id": 0, "date_of_birth": 1, "sex": 1}) or {}
+
+    entries = results.results
+    age = age_on(patient.get("date_of_birth"), appointment.get("date"))
+    low, high, flags = evaluate_reference_ranges(
+        [analyte_key(r.analyte) for r in entries],
+        np.array([r.value for r in entries], dtype=float),
+        np.full(len(entries), np.nan if age is None else age),
+        [patient.get("sex")] * len(entries),
+        np.array([np.nan if r.reference_low is None else r.reference_low for r in entries], dtype=float),
+        np.array([np.nan if r.reference_high is None else r.reference_high for r in entries], dtype=float)
+    )
+    lab_results = [
+        {**r.model_dump(), "reference_low": nan_to_none(low[i]), "reference_high": nan_to_none(high[i]), "flag": str(flags[i]) or None}
+        for i, r in enumerate(entries)
+    ]
+
+    await db.appointments.update_one(
+        {"id": appointment_id},
+        {"$set": {"lab_results": lab_results, "results_remarks": results.remarks}}
+    )
+    record_audit(admin, "update", "appointments", appointment_id, audit_diff(
+        {"lab_results": appointment.get("lab_results"), "results_remarks": appointment.get("results_remarks")},
+        {"lab_results": lab_results, "results_remarks": results.remarks}
+    ))
+    await store_patient_results({**appointment, "id": appointment_id, "lab_results": lab_results})
+    return {"message": "Lab results saved successfully", "results": lab_results}
+
+
+@api_router.get("/results/trends")
+async def get_my_result_trends(analyte: Optional[str] = None, current_user: Dict[str, Any] = Depends(get_current_user)):
+    return await build_result_trends(current_user["id"], analyte, published_only=True)
+
+
+@api_router.get("/admin/patients/{patient_id}/results/trends")
+async def get_patient_result_trends(patient_id: str, analyte: Optional[str] = None, admin: Dict[str, Any] = Depends(get_admin_user)):
+    return await build_result_trends(patient_id, analyte)
+
+
+@api_router.post("/reports/generate/{appointment_id}")
+async def generate_appointment_report(appointment_id: str, admin: Dict[str, Any] = Depends(get_admin_user)):
+    appointment = await db.appointments.find_one({"id": appointment_id}, {"_id": 0})
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    if not appointment.get("lab_results"):
+        raise HTTPException(status_code=400, detail="No lab results recorded for this appointment")
+    if appointment.get("report_uploaded"):
+        raise HTTPException(status_code=409, detail="A report has already been issued for this appointment")
+    try:
+        report = await generate_report(appointment)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Report generation failed: {str(e)}")
+    record_audit(admin, "generate", "reports", report.id, audit_diff(None, report.model_dump()))
+    return {"message": "Report generated successfully", "report": report}
+
+
+@api_router.post("/admin/reports/generate-batch")
+async def generate_reports_for_date(date: str, admin: Dict[str, Any] = Depends(get_admin_user)):
+    appointments = await db.appointments.find(
+        {"date": date, "lab_results": {"$exists": True, "$ne": []}, "report_uploaded": {"$ne": True}, "status": {"$ne": "cancelled"}},
+        {"_id": 0}
+    ).to_list(None)
+    # Rendering is bounded by the pool anyway; the semaphore also bounds pending tasks and their Mongo writes.
+    limit = asyncio.Semaphore(REPORT_RENDER_WORKERS)
+
+    async def generate(appointment: Dict[str, Any]) -> Report:
+        async with limit:
+            return await generate_report(appointment)
+
+    outcomes = await asyncio.gather(*[generate(a) for a in appointments], return_exceptions=True)
+
+    generated, failed = [], []
+    for appointment, outcome in zip(appointments, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Report generation failed for %s: %s", appointment["booking_id"], outcome)
+            failed.append({"booking_id": appointment["booking_id"], "error": getattr(outcome, "detail", None) or str(outcome)})
+        else:
+            record_audit(admin, "generate", "reports", outcome.id, audit_diff(None, outcome.model_dump()))
+            generated.append({"booking_id": appointment["booking_id"], "report_id": outcome.report_id})
+    return {"date": date, "generated": generated, "failed": failed}
+
+
 @api_router.get("/reports")
 async def get_user_reports(current_user: Dict[str, Any] = Depends(get_current_user)):
     reports = await db.reports.find({"patient_id": current_user["id"]}, {"_id": 0}).sort("report_date", -1).to_list(1000)
@@ -527,7 +2143,7 @@ async def get_user_reports(current_user: Dict[str, Any] = Depends(get_current_us
 
 @api_router.get("/reports/all")
 async def get_all_reports(admin: Dict[str, Any] = Depends(get_admin_user)):
-    reports = await db.reports.find({}, {"_id": 0}).sort("uploaded_at", -1).to_list(1000)
+    reports = await admin_db.reports.find({}, {"_id": 0}).sort("uploaded_at", -1).to_list(1000)
     return reports
 
 
@@ -540,11 +2156,20 @@ async def download_report(report_id: str, current_user: Dict[str, Any] = Depends
     if report["patient_id"] != current_user["id"] and current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    file_path = Path("/app/backend/reports") / report["file_name"]
+    if report.get("storage_tier") == "archive":
+        archive_path = ARCHIVE_DIR / report["archive_path"]
+        if not archive_path.exists():
+            raise HTTPException(status_code=404, detail="Report file not found")
+        return StreamingResponse(
+            iter_archived_report(archive_path),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{report["file_name"]}"'}
+        )
+    
+    file_path = REPORTS_DIR / report["file_name"]
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Report file not found")
     
-    from fastapi.responses import FileResponse
     return FileResponse(
         path=str(file_path),
         filename=report["file_name"],
@@ -558,38 +2183,493 @@ async def delete_report(report_id: str, admin: Dict[str, Any] = Depends(get_admi
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    file_path = Path("/app/backend/reports") / report["file_name"]
+    file_path = REPORTS_DIR / report["file_name"]
     if file_path.exists():
         file_path.unlink()
+    if report.get("archive_path"):
+        archive_path = ARCHIVE_DIR / report["archive_path"]
+        if archive_path.exists():
+            archive_path.unlink()
     
     await db.reports.delete_one({"id": report_id})
+    record_audit(admin, "delete", "reports", report_id, audit_diff(report, None))
     return {"message": "Report deleted successfully"}
 
 
+def compress_report_file(source: Path, destination: Path):
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(destination.name + ".partial")
+    compressor = zstandard.ZstdCompressor(level=REPORT_ARCHIVE_ZSTD_LEVEL, write_checksum=True)
+    with open(source, "rb") as src, open(partial, "wb") as dst:
+        compressor.copy_stream(src, dst, size=source.stat().st_size)
+    partial.replace(destination)
+
+def iter_archived_report(archive_path: Path, chunk_size: int = 64 * 1024):
+    """Decompress an archived report incrementally; run by Starlette in a threadpool."""
+    decompressor = zstandard.ZstdDecompressor()
+    with open(archive_path, "rb") as f:
+        yield from decompressor.read_to_iter(f, read_size=chunk_size, write_size=chunk_size)
+
+def archivable_reports_query() -> Dict[str, Any]:
+    """Hot reports, plus reports whose archiving claim outlived its lease (the worker died mid-way)."""
+    expired = (datetime.now(timezone.utc) - timedelta(seconds=REPORT_ARCHIVE_LEASE_SECONDS)).isoformat()
+    return {"$or": [
+        {"storage_tier": {"$in": [None, "hot"]}},
+        {"storage_tier": "archiving", "archive_claimed_at": {"$lt": expired}},
+    ]}
+
+async def archive_report(report: Dict[str, Any]) -> bool:
+    # Claim the report first so concurrent workers never compress the same file.
+    claimed = await db.reports.update_one(
+        {"id": report["id"], **archivable_reports_query()},
+        {"$set": {"storage_tier": "archiving", "archive_claimed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if not claimed.modified_count:
+        return False
+
+    source = REPORTS_DIR / report["file_name"]
+    month = report["uploaded_at"][:7]
+    relative_path = f"{month}/{report['file_name']}.zst"
+    if not source.exists():
+        # Nothing to archive; a terminal tier keeps it from heading every future batch.
+        logger.warning("Report %s has no file at %s, marking it missing", report["id"], source)
+        await db.reports.update_one({"id": report["id"]}, {"$set": {"storage_tier": "missing"}})
+        return False
+    try:
+        await asyncio.to_thread(compress_report_file, source, ARCHIVE_DIR / relative_path)
+        await db.reports.update_one(
+            {"id": report["id"]},
+            {"$set": {
+                "storage_tier": "archive",
+                "archive_path": relative_path,
+                "archived_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+    except Exception:
+        logger.exception("Failed to archive report %s", report["id"])
+        await db.reports.update_one({"id": report["id"]}, {"$set": {"storage_tier": "hot"}})
+        return False
+
+    source.unlink(missing_ok=True)
+    return True
+
+async def archive_old_reports(older_than_days: int = REPORT_ARCHIVE_AFTER_DAYS, limit: int = REPORT_ARCHIVE_BATCH_SIZE) -> int:
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    candidates = await db.reports.find(
+        {**archivable_reports_query(), "uploaded_at": {"$lt": cutoff}},
+        {"_id": 0, "id": 1, "file_name": 1, "uploaded_at": 1}
+    ).sort("uploaded_at", 1).to_list(limit)
+
+    archived = 0
+    for report in candidates:
+        if await archive_report(report):
+            archived += 1
+    return archived
+
+async def report_archiver_loop():
+    while True:
+        try:
+            while await archive_old_reports() == REPORT_ARCHIVE_BATCH_SIZE:
+                pass
+        except Exception:
+            logger.exception("Report archiver pass failed")
+        await asyncio.sleep(REPORT_ARCHIVE_INTERVAL_SECONDS)
+
+
+@api_router.post("/admin/reports/archive")
+async def run_report_archive(older_than_days: int = REPORT_ARCHIVE_AFTER_DAYS, admin: Dict[str, Any] = Depends(get_admin_user)):
+    archived = await archive_old_reports(older_than_days)
+    return {"message": "Report archive pass completed", "archived": archived}
+
+
+class RateLimiter:
+    """Token bucket shared by every dispatch task of one channel."""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.tokens = rate_per_second
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, count: int = 1):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count or self.tokens >= self.rate:
+                    self.tokens -= count
+                    return
+                await asyncio.sleep((min(count, self.rate) - self.tokens) / self.rate)
+
+class SmtpEmailProvider:
+    """Sends a chunk of emails over a single SMTP session (e.g. a local `aiosmtpd` sink on port 1025)."""
+
+    def send_chunk(self, messages: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        errors: Dict[str, Optional[str]] = {}
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+            if SMTP_USE_TLS:
+                smtp.starttls()
+            if SMTP_USERNAME:
+                smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = SMTP_FROM
+                email["To"] = message["recipient"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    errors[message["id"]] = None
+                except smtplib.SMTPException as e:
+                    errors[message["id"]] = str(e)
+        return errors
+
+    async def send(self, messages: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        return await asyncio.to_thread(self.send_chunk, messages)
+
+class LogSmsProvider:
+    """Default SMS provider: writes messages to the log. Replace via SMS_PROVIDERS."""
+
+    async def send(self, messages: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        for message in messages:
+            logger.info("SMS to %s: %s", message["recipient"], message["body"])
+        return {message["id"]: None for message in messages}
+
+SMS_PROVIDERS = {"log": LogSmsProvider}
+notification_providers: Dict[str, Any] = {}
+notification_rate_limiters = {channel: RateLimiter(rate) for channel, rate in NOTIFICATION_RATE_LIMITS.items()}
+
+def get_notification_provider(channel: str):
+    if channel not in notification_providers:
+        if channel == "email":
+            notification_providers[channel] = SmtpEmailProvider()
+        elif channel == "sms":
+            notification_providers[channel] = SMS_PROVIDERS[SMS_PROVIDER]()
+        else:
+            raise ValueError(f"Unknown notification channel: {channel}")
+    return notification_providers[channel]
+
+async def enqueue_notifications(appointment: Dict[str, Any], kind: str, subject: str, body: str):
+    """Write email and SMS messages to the outbox; delivery happens in the dispatcher."""
+    now = datetime.now(timezone.utc).isoformat()
+    messages = [
+        {"channel": "email", "recipient": appointment.get("user_email")},
+        {"channel": "sms", "recipient": appointment.get("user_phone")},
+    ]
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "channel": m["channel"],
+            "recipient": m["recipient"],
+            "user_id": appointment.get("user_id"),
+            "appointment_id": appointment.get("id"),
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "last_error": None,
+            "created_at": now,
+            "sent_at": None
+        }
+        for m in messages if m["recipient"]
+    ]
+    try:
+        if docs:
+            await db.notifications.insert_many(docs, ordered=False)
+    except Exception:
+        logger.exception("Failed to enqueue %s notifications for appointment %s", kind, appointment.get("id"))
+
+async def claim_notifications(limit: int) -> List[Dict[str, Any]]:
+    """Atomically lease a batch of due messages to this worker."""
+    now = datetime.now(timezone.utc)
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now.isoformat()}},
+        {"status": "sending", "claimed_at": {"$lt": (now - timedelta(seconds=NOTIFICATION_LEASE_SECONDS)).isoformat()}},
+    ]}
+    candidates = await db.notifications.find(due, {"_id": 0, "id": 1}).sort("next_attempt_at", 1).to_list(limit)
+    if not candidates:
+        return []
+    claim_token = str(uuid.uuid4())
+    await db.notifications.update_many(
+        {"id": {"$in": [c["id"] for c in candidates]}, **due},
+        {"$set": {"status": "sending", "claim_token": claim_token, "claimed_at": now.isoformat()}}
+    )
+    return await db.notifications.find({"claim_token": claim_token}, {"_id": 0}).to_list(limit)
+
+async def deliver_chunk(channel: str, chunk: List[Dict[str, Any]], semaphore: asyncio.Semaphore):
+    async with semaphore:
+        await notification_rate_limiters[channel].acquire(len(chunk))
+        try:
+            results = await get_notification_provider(channel).send(chunk)
+        except Exception as e:
+            logger.warning("Delivery of %d %s notifications failed: %s", len(chunk), channel, e)
+            results = {message["id"]: str(e) for message in chunk}
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    for message in chunk:
+        error = results.get(message["id"], "No delivery result")
+        if error is None:
+            update = {"status": "sent", "sent_at": now.isoformat(), "last_error": None}
+        else:
+            attempts = message["attempts"] + 1
+            retry_at = now + timedelta(seconds=min(30 * 2 ** attempts, 3600))
+            update = {
+                "status": "failed" if attempts >= NOTIFICATION_MAX_ATTEMPTS else "pending",
+                "attempts": attempts,
+                "last_error": error,
+                "next_attempt_at": retry_at.isoformat()
+            }
+        operations.append(UpdateOne({"id": message["id"], "claim_token": message["claim_token"]}, {"$set": update}))
+    await db.notifications.bulk_write(operations, ordered=False)
+
+def notification_chunk_size(channel: str) -> int:
+    """A chunk never exceeds one second of the channel's rate, so a full bucket cannot release a burst above it."""
+    return max(1, min(NOTIFICATION_CHUNK_SIZE, int(NOTIFICATION_RATE_LIMITS.get(channel, NOTIFICATION_CHUNK_SIZE))))
+
+async def dispatch_notifications() -> int:
+    messages = await claim_notifications(NOTIFICATION_BATCH_SIZE)
+    semaphore = asyncio.Semaphore(NOTIFICATION_CONCURRENCY)
+    by_channel: Dict[str, List[Dict[str, Any]]] = {}
+    for message in messages:
+        by_channel.setdefault(message["channel"], []).append(message)
+    await asyncio.gather(*[
+        deliver_chunk(channel, batch[i:i + size], semaphore)
+        for channel, batch in by_channel.items()
+        for size in [notification_chunk_size(channel)]
+        for i in range(0, len(batch), size)
+    ])
+    return len(messages)
+
+async def notification_dispatcher_loop():
+    while True:
+        try:
+            if await dispatch_notifications() == NOTIFICATION_BATCH_SIZE:
+                continue
+        except Exception:
+            logger.exception("Notification dispatch pass failed")
+        await asyncio.sleep(NOTIFICATION_POLL_INTERVAL_SECONDS)
+
+
+@api_router.get("/admin/notifications")
+async def get_notifications(status: Optional[str] = None, admin: Dict[str, Any] = Depends(get_admin_user)):
+    query = {"status": status} if status else {}
+    notifications = await admin_db.notifications.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
+    return notifications
+
+
+EXPORT_COLLECTIONS = {
+    "appointments": (Appointment, "created_at"),
+    "payments": (Payment, "created_at"),
+    "reports": (Report, "uploaded_at"),
+}
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_BATCH_SIZE = 1000
+background_tasks = set()
+
+def build_export_query(collection: str, start_date: Optional[str], end_date: Optional[str], status_filter: Optional[str]) -> Dict[str, Any]:
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown export collection")
+    _, date_field = EXPORT_COLLECTIONS[collection]
+    query: Dict[str, Any] = {}
+    date_range: Dict[str, str] = {}
+    try:
+        if start_date:
+            date_range["$gte"] = datetime.fromisoformat(start_date).date().isoformat()
+        if end_date:
+            date_range["$lt"] = (datetime.fromisoformat(end_date).date() + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if date_range:
+        query[date_field] = date_range
+    if status_filter:
+        query["status"] = status_filter
+    return query
+
+def format_export_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return "; ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str)
+    return "" if value is None else value
+
+async def iter_export_chunks(collection: str, query: Dict[str, Any], fmt: str, compress: bool, counter: Optional[Dict[str, int]] = None):
+    """Yield encoded export bytes one cursor batch at a time."""
+    model, date_field = EXPORT_COLLECTIONS[collection]
+    columns = list(model.model_fields)
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    cursor = analytics_db[collection].find(query, {"_id": 0}).sort(date_field, 1).batch_size(EXPORT_BATCH_SIZE)
+    rows_in_chunk = 0
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([format_export_value(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(doc, default=str))
+            buffer.write("\n")
+        rows_in_chunk += 1
+        if counter is not None:
+            counter["rows"] = counter.get("rows", 0) + 1
+        if rows_in_chunk >= EXPORT_BATCH_SIZE:
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows_in_chunk = 0
+            yield compressor.compress(data) if compressor else data
+
+    data = buffer.getvalue().encode("utf-8")
+    if compressor:
+        yield compressor.compress(data) + compressor.flush()
+    elif data:
+        yield data
+
+def export_file_name(collection: str, fmt: str, compress: bool, job_id: Optional[str] = None) -> str:
+    """Download name for an export; job files also carry the job id so concurrent jobs never share a path."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    suffix = f"_{job_id}" if job_id else ""
+    return f"{collection}_{stamp}{suffix}.{fmt}" + (".gz" if compress else "")
+
+async def run_export_job(job: Dict[str, Any]):
+    counter: Dict[str, int] = {"rows": 0}
+    file_path = EXPORTS_DIR / job["file_name"]
+    await db.export_jobs.update_one({"id": job["id"]}, {"$set": {"status": "running"}})
+    try:
+        EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+        filters = job["filters"]
+        query = build_export_query(job["collection"], filters.get("start_date"), filters.get("end_date"), filters.get("status"))
+        with open(file_path, "wb") as f:
+            async for chunk in iter_export_chunks(job["collection"], query, job["format"], job["gzip"], counter):
+                await asyncio.to_thread(f.write, chunk)
+        await db.export_jobs.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "completed", "rows": counter["rows"], "completed_at": datetime.now(timezone.utc).isoformat()}}
+        )
+    except asyncio.CancelledError:
+        # Shutdown cancels background tasks; don't leave the job "running" with a partial file.
+        logger.warning("Export job %s interrupted", job["id"])
+        file_path.unlink(missing_ok=True)
+        await db.export_jobs.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "interrupted", "error": "Server shut down before the export finished", "completed_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        raise
+    except Exception as e:
+        logger.exception("Export job %s failed", job["id"])
+        if file_path.exists():
+            file_path.unlink()
+        await db.export_jobs.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "failed", "error": str(e), "completed_at": datetime.now(timezone.utc).isoformat()}}
+        )
+
+
+@api_router.get("/admin/exports/{collection}")
+async def stream_export(
+    collection: str,
+    format: str = "csv",
+    gzip: bool = False,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    query = build_export_query(collection, start_date, end_date, status)
+    file_name = export_file_name(collection, format, gzip)
+    return StreamingResponse(
+        iter_export_chunks(collection, query, format, gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+
+@api_router.post("/admin/exports/{collection}/jobs")
+async def create_export_job(
+    collection: str,
+    format: str = "csv",
+    gzip: bool = True,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    build_export_query(collection, start_date, end_date, status)
+
+    job = ExportJob(
+        collection=collection,
+        format=format,
+        gzip=gzip,
+        filters={"start_date": start_date, "end_date": end_date, "status": status},
+        requested_by=admin["id"]
+    )
+    job.file_name = export_file_name(collection, format, gzip, job.id)
+    job_doc = job.model_dump()
+    job_doc["created_at"] = job_doc["created_at"].isoformat()
+    await db.export_jobs.insert_one(job_doc)
+
+    task = asyncio.create_task(run_export_job(job_doc))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    return {"message": "Export job queued", "job": job}
+
+
+@api_router.get("/admin/export-jobs")
+async def get_export_jobs(admin: Dict[str, Any] = Depends(get_admin_user)):
+    jobs = await db.export_jobs.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    return jobs
+
+
+@api_router.get("/admin/export-jobs/{job_id}/download")
+async def download_export(job_id: str, admin: Dict[str, Any] = Depends(get_admin_user)):
+    job = await db.export_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+
+    file_path = EXPORTS_DIR / job["file_name"]
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Export file not found")
+
+    media_type = "application/gzip" if job["gzip"] else EXPORT_FORMATS[job["format"]]
+    return FileResponse(path=str(file_path), filename=job["file_name"], media_type=media_type)
+
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(admin: Dict[str, Any] = Depends(get_admin_user)):
-    total_bookings = await db.appointments.count_documents({})
-    pending_appointments = await db.appointments.count_documents({"status": "pending"})
-    completed_appointments = await db.appointments.count_documents({"status": "completed"})
+    total_bookings = await analytics_db.appointments.count_documents({})
+    pending_appointments = await analytics_db.appointments.count_documents({"status": "pending"})
+    completed_appointments = await analytics_db.appointments.count_documents({"status": "completed"})
     
-    payments = await db.payments.find({"status": "completed"}, {"_id": 0, "amount": 1}).to_list(10000)
+    payments = await analytics_db.payments.find({"status": "completed"}, {"_id": 0, "amount": 1}).to_list(10000)
     total_revenue = sum(p["amount"] for p in payments)
     
-    pending_reports = await db.appointments.count_documents({
+    pending_reports = await analytics_db.appointments.count_documents({
         "payment_status": "completed",
         "status": {"$ne": "completed"},
         "report_uploaded": {"$ne": True}
     })
     
-    total_reports_uploaded = await db.reports.count_documents({})
+    total_reports_uploaded = await analytics_db.reports.count_documents({})
     
     today = datetime.now(timezone.utc).date().isoformat()
-    reports_ready_today = await db.reports.count_documents({
+    reports_ready_today = await analytics_db.reports.count_documents({
         "status": "ready",
         "report_date": {"$regex": f"^{today}"}
     })
     
-    processing_reports = await db.reports.count_documents({"status": "processing"})
+    processing_reports = await analytics_db.reports.count_documents({"status": "processing"})
     
     return {
         "total_bookings": total_bookings,
@@ -603,12 +2683,227 @@ async def get_admin_stats(admin: Dict[str, Any] = Depends(get_admin_user)):
     }
 
 
+ROLLUP_DIMENSIONS = ("all", "test", "category", "payment_mode")
+ROLLUP_METRICS = ("bookings", "booking_amount", "payments", "revenue", "reports")
+
+def rollup_keys(appointment: Dict[str, Any], category: Optional[str]) -> List[Tuple[str, str, str]]:
+    """(dimension, key, label) triples an appointment contributes to."""
+    if appointment.get("test_type") == "package":
+        category = "Package"
+    payment_mode = appointment.get("payment_mode") or "unknown"
+    return [
+        ("all", "all", "All"),
+        ("test", appointment.get("test_id") or "unknown", appointment.get("test_name") or "Unknown"),
+        ("category", category or "General", category or "General"),
+        ("payment_mode", payment_mode, payment_mode),
+    ]
+
+def rollup_operations(day: str, keys: List[Tuple[str, str, str]], increments: Dict[str, float]) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"date": day, "dimension": dimension, "key": key},
+            {"$inc": increments, "$set": {"label": label}},
+            upsert=True
+        )
+        for dimension, key, label in keys
+    ]
+
+async def record_rollup(appointment: Dict[str, Any], increments: Dict[str, float]):
+    """Fold one booking, payment or report event into today's rollups.
+
+    Analytics must never fail the request that triggered it, so errors are
+    logged and swallowed; the backfill command can repair any gaps.
+    """
+    try:
+        category = None
+        if appointment.get("test_type") != "package":
+            test = await db.tests.find_one({"id": appointment.get("test_id")}, {"_id": 0, "category": 1})
+            category = (test or {}).get("category")
+        day = datetime.now(timezone.utc).date().isoformat()
+        await db.daily_rollups.bulk_write(rollup_operations(day, rollup_keys(appointment, category), increments), ordered=False)
+    except Exception:
+        logger.exception("Failed to record rollup for appointment %s", appointment.get("id"))
+
+async def backfill_rollups(start_date: str, end_date: str) -> int:
+    """Recompute rollups for [start_date, end_date] from raw collections.
+
+    Today is never rebuilt: record_rollup is still incrementing it, and a
+    rebuild would race with those live upserts. Each rebuilt row replaces the
+    stored one in place, and rows in the range that no longer have any events
+    are removed afterwards. Source data is read from the primary: secondaries
+    may lag, and anything they miss would be dropped from the rebuilt rows.
+    """
+    start = datetime.fromisoformat(start_date).date().isoformat()
+    end = min(datetime.fromisoformat(end_date).date() + timedelta(days=1), datetime.now(timezone.utc).date()).isoformat()
+    if start >= end:
+        return 0
+    in_range = {"$gte": start, "$lt": end}
+
+    categories = {t["id"]: t.get("category") async for t in db.tests.find({}, {"_id": 0, "id": 1, "category": 1})}
+    totals: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def add(day: str, keys: List[Tuple[str, str, str]], increments: Dict[str, float]):
+        for dimension, key, label in keys:
+            entry = totals.setdefault((day, dimension, key), {"label": label, **{m: 0 for m in ROLLUP_METRICS}})
+            for metric, value in increments.items():
+                entry[metric] += value
+
+    # Rollup keys depend only on these fields, so appointments are remembered by a
+    # shared signature and only those the range actually touches are read.
+    signature_fields = ("test_id", "test_name", "test_type", "payment_mode")
+    projection = {"_id": 0, "id": 1, "created_at": 1, "amount": 1, **{f: 1 for f in signature_fields}}
+    signatures: Dict[Tuple[Any, ...], List[Tuple[str, str, str]]] = {}
+    appointment_signatures: Dict[str, Tuple[Any, ...]] = {}
+
+    def remember(appointment: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        signature = tuple(appointment.get(f) for f in signature_fields)
+        if signature not in signatures:
+            signatures[signature] = rollup_keys(appointment, categories.get(appointment.get("test_id")))
+        appointment_signatures[appointment["id"]] = signature
+        return signatures[signature]
+
+    async for appointment in db.appointments.find({"created_at": in_range}, projection):
+        keys = remember(appointment)
+        add(appointment["created_at"][:10], keys, {"bookings": 1, "booking_amount": appointment.get("amount", 0)})
+
+    payment_filter = {"status": "completed", "$or": [{"verified_at": in_range}, {"verified_at": None, "created_at": in_range}]}
+    payments = [
+        (p.get("appointment_id"), (p.get("verified_at") or p["created_at"])[:10], p.get("amount", 0))
+        async for p in db.payments.find(payment_filter, {"_id": 0, "appointment_id": 1, "amount": 1, "verified_at": 1, "created_at": 1})
+    ]
+    reports = [
+        (r.get("appointment_id"), r["uploaded_at"][:10])
+        async for r in db.reports.find({"uploaded_at": in_range}, {"_id": 0, "appointment_id": 1, "uploaded_at": 1})
+    ]
+
+    referenced = list(({p[0] for p in payments} | {r[0] for r in reports}) - set(appointment_signatures) - {None})
+    for offset in range(0, len(referenced), ROLLUP_BACKFILL_BATCH_SIZE):
+        batch = referenced[offset:offset + ROLLUP_BACKFILL_BATCH_SIZE]
+        async for appointment in db.appointments.find({"id": {"$in": batch}}, projection):
+            remember(appointment)
+
+    for appointment_id, day, amount in payments:
+        if appointment_id in appointment_signatures:
+            add(day, signatures[appointment_signatures[appointment_id]], {"payments": 1, "revenue": amount})
+    for appointment_id, day in reports:
+        if appointment_id in appointment_signatures:
+            add(day, signatures[appointment_signatures[appointment_id]], {"reports": 1})
+
+    operations = [
+        ReplaceOne(
+            {"date": day, "dimension": dimension, "key": key},
+            {"date": day, "dimension": dimension, "key": key, **entry},
+            upsert=True
+        )
+        for (day, dimension, key), entry in totals.items()
+    ]
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+    stale = [
+        row["_id"]
+        async for row in db.daily_rollups.find({"date": in_range}, {"date": 1, "dimension": 1, "key": 1})
+        if (row["date"], row["dimension"], row["key"]) not in totals
+    ]
+    if stale:
+        await db.daily_rollups.delete_many({"_id": {"$in": stale}})
+    return len(operations)
+
+
+@api_router.get("/admin/analytics/timeseries")
+async def get_analytics_timeseries(
+    start_date: str,
+    end_date: str,
+    metric: str = "bookings",
+    dimension: str = "all",
+    granularity: str = "day",
+    admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    if metric not in ROLLUP_METRICS:
+        raise HTTPException(status_code=400, detail=f"Metric must be one of {', '.join(ROLLUP_METRICS)}")
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Dimension must be one of {', '.join(ROLLUP_DIMENSIONS)}")
+    if granularity not in ("day", "week"):
+        raise HTTPException(status_code=400, detail="Granularity must be day or week")
+    try:
+        start = datetime.fromisoformat(start_date).date()
+        end = datetime.fromisoformat(end_date).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    rollups = analytics_db.daily_rollups.find(
+        {"dimension": dimension, "date": {"$gte": start.isoformat(), "$lte": end.isoformat()}},
+        {"_id": 0, "date": 1, "key": 1, "label": 1, metric: 1}
+    )
+
+    series: Dict[str, Dict[str, Any]] = {}
+    async for rollup in rollups:
+        bucket = rollup["date"]
+        if granularity == "week":
+            day = datetime.fromisoformat(bucket).date()
+            bucket = (day - timedelta(days=day.weekday())).isoformat()
+        entry = series.setdefault(rollup["key"], {"key": rollup["key"], "label": rollup.get("label"), "points": {}})
+        entry["points"][bucket] = entry["points"].get(bucket, 0) + rollup.get(metric, 0)
+
+    return {
+        "metric": metric,
+        "dimension": dimension,
+        "granularity": granularity,
+        "series": [
+            {**entry, "points": [{"date": d, "value": v} for d, v in sorted(entry["points"].items())]}
+            for entry in series.values()
+        ]
+    }
+
+
+@api_router.get("/admin/audit")
+async def get_audit_log(
+    collection: Optional[str] = None,
+    document_id: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    action: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 100,
+    admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    await flush_audit_log()
+    query: Dict[str, Any] = {}
+    for field, value in (("collection", collection), ("document_id", document_id), ("actor_id", actor_id), ("action", action)):
+        if value:
+            query[field] = value
+    try:
+        if start_date or end_date:
+            query["timestamp"] = {}
+        if start_date:
+            query["timestamp"]["$gte"] = datetime.fromisoformat(start_date).date().isoformat()
+        if end_date:
+            query["timestamp"]["$lt"] = (datetime.fromisoformat(end_date).date() + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    entries = await db.audit_log.find(query, {"_id": 0}).sort("timestamp", -1).to_list(min(max(limit, 1), 1000))
+    return entries
+
+
 @api_router.get("/admin/users")
 async def get_all_users(admin: Dict[str, Any] = Depends(get_admin_user)):
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+    users = await admin_db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
     return users
 
 
+@api_router.put("/admin/users/{user_id}/membership")
+async def update_user_membership(user_id: str, data: Dict[str, Any], admin: Dict[str, Any] = Depends(get_admin_user)):
+    membership_id = data.get("membership_id")
+    if membership_id and not await db.memberships.find_one({"id": membership_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Membership not found")
+    before = await db.users.find_one_and_update(
+        {"id": user_id}, {"$set": {"membership_id": membership_id}},
+        projection={"_id": 0, "membership_id": 1}, return_document=ReturnDocument.BEFORE
+    )
+    if before is not None:
+        record_audit(admin, "update", "users", user_id, audit_diff(before, {**before, "membership_id": membership_id}))
+    return {"message": "User membership updated successfully"}
+
+
 @api_router.post("/admin/seed-data")
 async def seed_initial_data(admin: Dict[str, Any] = Depends(get_admin_user)):
     sample_tests = [
@@ -634,12 +2929,19 @@ async def seed_initial_data(admin: Dict[str, Any] = Depends(get_admin_user)):
     await db.tests.insert_many(sample_tests)
     await db.packages.insert_many(sample_packages)
     await db.memberships.insert_many(sample_memberships)
+    invalidate_catalog()
+    record_audit(admin, "seed", "catalog", None, {}, details={
+        "tests": [t["id"] for t in sample_tests],
+        "packages": [p["id"] for p in sample_packages],
+        "memberships": [m["id"] for m in sample_memberships]
+    })
     
     return {"message": "Sample data seeded successfully"}
 
 
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -654,6 +2956,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await db.idempotency_keys.create_index("key", unique=True)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    await db.daily_rollups.create_index([("dimension", 1), ("date", 1), ("key", 1)], unique=True)
+    await db.reports.create_index([("storage_tier", 1), ("uploaded_at", 1)])
+    await db.audit_log.create_index([("collection", 1), ("document_id", 1), ("timestamp", -1)])
+    await db.audit_log.create_index([("actor_id", 1), ("timestamp", -1)])
+    await db.audit_log.create_index("timestamp")
+    await db.notifications.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.notifications.create_index("claim_token")
+    await db.appointments.create_index([("user_id", 1), ("created_at", -1)])
+    await db.appointments.create_index("created_at")
+    await db.appointments.create_index("id")
+    await db.reports.create_index([("patient_id", 1), ("report_date", -1)])
+    await db.payments.create_index([("user_id", 1), ("created_at", -1)])
+    await db.patient_results.create_index("patient_id", unique=True)
+    await db.slot_availability.create_index("date", unique=True)
+    await db.waitlist.create_index([("date", 1), ("status", 1), ("created_at", 1)])
+    await db.waitlist.create_index([("user_id", 1), ("created_at", -1)])
+
+@app.on_event("startup")
+async def start_notification_dispatcher():
+    task = asyncio.create_task(notification_dispatcher_loop())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.on_event("startup")
+async def start_audit_flusher():
+    task = asyncio.create_task(audit_flusher_loop())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.on_event("startup")
+async def start_report_archiver():
+    task = asyncio.create_task(report_archiver_loop())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    tasks = list(background_tasks)
+    for task in tasks:
+        task.cancel()
+    # Let cancelled tasks run their cleanup before the client closes.
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await flush_audit_log()
+    if report_render_pool["pool"] is not None:
+        report_render_pool["pool"].shutdown(wait=False, cancel_futures=True)
     client.close()
@@ -3,6 +3,7 @@
 import requests
 import sys
 import json
+import uuid
 from datetime import datetime, timedelta
 
 class AmbicaDiagnosticTester:
@@ -13,6 +14,7 @@ class AmbicaDiagnosticTester:
         self.tests_run = 0
         self.tests_passed = 0
         self.created_appointment_id = None
+        self.test_item = None
 
     def log_test(self, test_name, passed, message=""):
         """Log test result"""
@@ -129,12 +131,32 @@ class AmbicaDiagnosticTester:
 
     def test_get_tests(self):
         """Test getting all tests"""
-        return self.run_api_test("Get Tests", "GET", "/api/tests", 200)
+        success, response = self.run_api_test("Get Tests", "GET", "/api/tests", 200)
+        if success and isinstance(response, list) and response:
+            self.test_item = response[0]
+        return success, response
+
+    def test_price_quote(self):
+        """Test server-side price quote"""
+        if not self.patient_token or not self.test_item:
+            return self.log_test("Price Quote", False, "- Missing patient token or catalog test"), {}
+        return self.run_api_test(
+            "Price Quote",
+            "POST",
+            "/api/pricing/quote",
+            200,
+            data={"items": [{"item_type": "test", "item_id": self.test_item["id"]}], "home_collection": True},
+            token=self.patient_token
+        )
 
     def test_get_packages(self):
         """Test getting all packages"""
         return self.run_api_test("Get Packages", "GET", "/api/packages", 200)
 
+    def test_get_expanded_packages(self):
+        """Test package views with resolved tests and savings"""
+        return self.run_api_test("Get Expanded Packages", "GET", "/api/packages/expanded", 200)
+
     def test_get_memberships(self):
         """Test getting all memberships"""
         return self.run_api_test("Get Memberships", "GET", "/api/memberships", 200)
@@ -149,21 +171,47 @@ class AmbicaDiagnosticTester:
             200
         )
 
+    def test_next_available_slots(self):
+        """Test finding the next free appointment slots"""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        return self.run_api_test(
+            "Next Available Slots",
+            "GET",
+            f"/api/appointments/slots/next?date={tomorrow}&after=07:00&count=3",
+            200
+        )
+
+    def next_free_slot(self):
+        """Earliest slot with capacity from tomorrow on, so repeated runs don't hit a full slot"""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/appointments/slots/next",
+                params={"date": tomorrow, "count": 1, "days": 30},
+                timeout=30
+            )
+            slots = response.json().get("slots", [])
+        except Exception:
+            slots = []
+        if slots:
+            return slots[0]["date"], slots[0]["time"]
+        return tomorrow, "06:00"
+
     def test_create_appointment(self):
         """Test creating an appointment"""
         if not self.patient_token:
             return self.log_test("Create Appointment", False, "- No patient token available"), {}
         
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        date, time_slot = self.next_free_slot()
         appointment_data = {
             "user_name": "Test Patient",
             "user_email": "patient@ambica.com", 
             "user_phone": "+91 9876543210",
             "test_type": "test",
-            "test_id": "test-123",
-            "test_name": "Test CBC",
-            "date": tomorrow,
-            "time_slot": "06:00",
+            "test_id": self.test_item["id"] if self.test_item else "test-123",
+            "test_name": self.test_item["name"] if self.test_item else "Test CBC",
+            "date": date,
+            "time_slot": time_slot,
             "payment_mode": "at_center",
             "amount": 350.0
         }
@@ -182,6 +230,50 @@ class AmbicaDiagnosticTester:
             
         return success, response
 
+    def test_idempotent_booking(self):
+        """Test that retrying a booking with the same Idempotency-Key books it once"""
+        if not self.patient_token:
+            return self.log_test("Idempotent Booking", False, "- No patient token available"), {}
+
+        date, time_slot = self.next_free_slot()
+        appointment_data = {
+            "user_name": "Test Patient",
+            "user_email": "patient@ambica.com",
+            "user_phone": "+91 9876543210",
+            "test_type": "test",
+            "test_id": self.test_item["id"] if self.test_item else "test-123",
+            "test_name": self.test_item["name"] if self.test_item else "Test CBC",
+            "date": date,
+            "time_slot": time_slot,
+            "payment_mode": "at_center"
+        }
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+        first_ok, first = self.run_api_test(
+            "Idempotent Booking (first)", "POST", "/api/appointments", 200,
+            data=appointment_data, headers=headers, token=self.patient_token
+        )
+        retry_ok, retry = self.run_api_test(
+            "Idempotent Booking (retry)", "POST", "/api/appointments", 200,
+            data=appointment_data, headers=headers, token=self.patient_token
+        )
+        booking_id = first.get("booking_id")
+        _, appointments = self.run_api_test(
+            "Idempotent Booking (list)", "GET", "/api/appointments", 200, token=self.patient_token
+        )
+        matches = [a for a in appointments if a.get("booking_id") == booking_id] if isinstance(appointments, list) else []
+        self.log_test(
+            "Idempotent Booking (single appointment)",
+            bool(booking_id) and retry.get("booking_id") == booking_id and len(matches) == 1,
+            f"- booking {booking_id}, retry {retry.get('booking_id')}, stored {len(matches)}"
+        )
+
+        mismatch_ok, _ = self.run_api_test(
+            "Idempotent Booking (different body)", "POST", "/api/appointments", 422,
+            data={**appointment_data, "payment_mode": "online"}, headers=headers, token=self.patient_token
+        )
+        return first_ok and retry_ok and mismatch_ok, first
+
     def test_get_user_appointments(self):
         """Test getting user's appointments"""
         if not self.patient_token:
@@ -194,6 +286,30 @@ class AmbicaDiagnosticTester:
             token=self.patient_token
         )
 
+    def test_patient_dashboard(self):
+        """Test patient dashboard aggregate"""
+        if not self.patient_token:
+            return self.log_test("Patient Dashboard", False, "- No patient token available"), {}
+        return self.run_api_test(
+            "Patient Dashboard",
+            "GET",
+            "/api/dashboard",
+            200,
+            token=self.patient_token
+        )
+
+    def test_result_trends(self):
+        """Test patient lab result trends"""
+        if not self.patient_token:
+            return self.log_test("Result Trends", False, "- No patient token available"), {}
+        return self.run_api_test(
+            "Result Trends",
+            "GET",
+            "/api/results/trends",
+            200,
+            token=self.patient_token
+        )
+
     def test_admin_get_all_appointments(self):
         """Test admin getting all appointments"""
         if not self.admin_token:
@@ -219,6 +335,27 @@ class AmbicaDiagnosticTester:
             token=self.admin_token
         )
 
+    def test_assign_technicians(self):
+        """Test batch technician assignment (admin)"""
+        if not self.admin_token:
+            return self.log_test("Assign Technicians", False, "- No admin token available"), {}
+        self.run_api_test(
+            "Create Technician",
+            "POST",
+            "/api/admin/technicians",
+            200,
+            data={"name": "Test Technician", "phone": "+91 9876543212", "base_latitude": 23.02, "base_longitude": 72.57, "capacity": 10},
+            token=self.admin_token
+        )
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        return self.run_api_test(
+            "Assign Technicians",
+            "POST",
+            f"/api/admin/technicians/assign?date={tomorrow}",
+            200,
+            token=self.admin_token
+        )
+
     def test_payment_order_creation(self):
         """Test creating payment order"""
         if not self.patient_token:
@@ -250,6 +387,44 @@ class AmbicaDiagnosticTester:
             token=self.admin_token
         )
 
+    def test_stream_export(self):
+        """Test streaming appointment export (admin)"""
+        if not self.admin_token:
+            return self.log_test("Stream Export", False, "- No admin token available"), {}
+        return self.run_api_test(
+            "Stream Appointments Export",
+            "GET",
+            "/api/admin/exports/appointments?format=ndjson",
+            200,
+            token=self.admin_token
+        )
+
+    def test_analytics_timeseries(self):
+        """Test analytics time-series query (admin)"""
+        if not self.admin_token:
+            return self.log_test("Analytics Timeseries", False, "- No admin token available"), {}
+        today = datetime.now().strftime('%Y-%m-%d')
+        week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        return self.run_api_test(
+            "Analytics Timeseries",
+            "GET",
+            f"/api/admin/analytics/timeseries?start_date={week_ago}&end_date={today}&metric=bookings&dimension=category",
+            200,
+            token=self.admin_token
+        )
+
+    def test_audit_log(self):
+        """Test audit log query (admin)"""
+        if not self.admin_token:
+            return self.log_test("Audit Log", False, "- No admin token available"), {}
+        return self.run_api_test(
+            "Audit Log",
+            "GET",
+            "/api/admin/audit?collection=appointments",
+            200,
+            token=self.admin_token
+        )
+
     def test_invalid_login(self):
         """Test login with invalid credentials"""
         return self.run_api_test(
@@ -280,20 +455,30 @@ class AmbicaDiagnosticTester:
         self.test_seed_data()
         self.test_admin_stats()
         self.test_admin_users()
+        self.test_stream_export()
+        self.test_analytics_timeseries()
         
         # Public data endpoints
         print("\n📦 Public Data Endpoints:")
         self.test_get_tests()
         self.test_get_packages()
+        self.test_get_expanded_packages()
         self.test_get_memberships()
+        self.test_price_quote()
         
         # Appointment flow
         print("\n📅 Appointment Management:")
         self.test_get_appointment_slots()
+        self.test_next_available_slots()
         self.test_create_appointment()
+        self.test_idempotent_booking()
         self.test_get_user_appointments()
+        self.test_patient_dashboard()
+        self.test_result_trends()
         self.test_admin_get_all_appointments()
         self.test_update_appointment_status()
+        self.test_assign_technicians()
+        self.test_audit_log()
         
         # Payment system
         print("\n💳 Payment System:")
@@ -1,9 +1,9 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import { Header } from '../components/Layout/Header';
 import { Footer } from '../components/Layout/Footer';
 import { useAuth } from '../context/AuthContext';
-import { testsAPI, packagesAPI, appointmentsAPI, paymentsAPI } from '../utils/api';
+import { testsAPI, packagesAPI, appointmentsAPI, paymentsAPI, pricingAPI } from '../utils/api';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
@@ -33,6 +33,9 @@ const BookAppointment = () => {
   });
   const [paymentMode, setPaymentMode] = useState('online');
   const [loading, setLoading] = useState(false);
+  const [quote, setQuote] = useState(null);
+  // One Idempotency-Key per booking attempt, reused when the patient retries it.
+  const bookingKey = useRef(null);
 
   useEffect(() => {
     fetchData();
@@ -45,6 +48,25 @@ const BookAppointment = () => {
     }
   }, []);
 
+  useEffect(() => {
+    bookingKey.current = null;
+  }, [selectedType, selectedItem, selectedDate, selectedSlot, paymentMode, formData]);
+
+  useEffect(() => {
+    setQuote(null);
+    if (!selectedItem) return;
+    let cancelled = false;
+    // The server prices the booking with the patient's membership; show that rather than the list price.
+    pricingAPI.quote([{ item_type: selectedType, item_id: selectedItem.id }], Boolean(formData.address))
+      .then((response) => {
+        if (!cancelled) setQuote(response.data);
+      })
+      .catch((error) => console.error('Failed to fetch price quote:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedType, selectedItem, formData.address]);
+
   useEffect(() => {
     if (selectedDate) {
       checkTimeAndFetchSlots();
@@ -111,6 +133,9 @@ const BookAppointment = () => {
     }
 
     setLoading(true);
+    if (!bookingKey.current) {
+      bookingKey.current = crypto.randomUUID();
+    }
 
     try {
       const appointmentData = {
@@ -129,14 +154,14 @@ const BookAppointment = () => {
         status: 'pending',
       };
 
-      const response = await appointmentsAPI.create(appointmentData);
+      const response = await appointmentsAPI.create(appointmentData, bookingKey.current);
       const appointment = response.data.appointment;
 
       if (paymentMode === 'online') {
         const orderResponse = await paymentsAPI.createOrder({
           amount: selectedItem.price,
           appointment_id: appointment.id,
-        });
+        }, bookingKey.current);
 
         const options = {
           key: orderResponse.data.key_id,
@@ -395,7 +420,7 @@ const BookAppointment = () => {
                       <span className="font-semibold text-gray-900">Total Amount:</span>
                       <div className="flex items-center font-bold text-[#2A7DE1]">
                         <IndianRupee className="w-5 h-5" />
-                        <span>{selectedItem.price}</span>
+                        <span>{quote ? quote.total : selectedItem.price}</span>
                       </div>
                     </div>
                   </div>
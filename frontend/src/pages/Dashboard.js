@@ -3,16 +3,16 @@ import { Link } from 'react-router-dom';
 import { Header } from '../components/Layout/Header';
 import { Footer } from '../components/Layout/Footer';
 import { useAuth } from '../context/AuthContext';
-import { appointmentsAPI, paymentsAPI, reportsAPI } from '../utils/api';
+import { dashboardAPI, reportsAPI } from '../utils/api';
 import { Card } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Calendar, FileText, IndianRupee, Download, Clock, CheckCircle, AlertCircle, TrendingUp, Shield, Lock } from 'lucide-react';
 
 const Dashboard = () => {
   const { user } = useAuth();
-  const [appointments, setAppointments] = useState([]);
-  const [payments, setPayments] = useState([]);
+  const [upcomingAppointments, setUpcomingAppointments] = useState([]);
   const [reports, setReports] = useState([]);
+  const [counts, setCounts] = useState({});
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -21,14 +21,10 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [appointmentsRes, paymentsRes, reportsRes] = await Promise.all([
-        appointmentsAPI.getMy(),
-        paymentsAPI.getHistory(),
-        reportsAPI.getMy(),
-      ]);
-      setAppointments(appointmentsRes.data);
-      setPayments(paymentsRes.data);
-      setReports(reportsRes.data);
+      const response = await dashboardAPI.get(10);
+      setUpcomingAppointments(response.data.upcoming_appointments);
+      setReports(response.data.recent_reports);
+      setCounts(response.data.counts);
     } catch (error) {
       console.error('Failed to fetch dashboard data:', error);
     } finally {
@@ -50,15 +46,9 @@ const Dashboard = () => {
     }
   };
 
-  const upcomingAppointments = appointments.filter(
-    (apt) => apt.status !== 'completed' && apt.status !== 'cancelled'
-  );
-
-  const pendingReports = appointments.filter(
-    (apt) => apt.payment_status === 'completed' && apt.status !== 'completed'
-  ).length;
+  const pendingReports = counts.pending_reports || 0;
 
-  const reportsReady = reports.filter(r => r.status === 'ready').length;
+  const reportsReady = counts.reports_ready || 0;
 
   if (loading) {
     return (
@@ -95,7 +85,7 @@ const Dashboard = () => {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm font-medium text-slate-600 mb-1">Total Appointments</p>
-                  <p className="text-4xl font-bold text-[#2A7DE1]">{appointments.length}</p>
+                  <p className="text-4xl font-bold text-[#2A7DE1]">{counts.appointments || 0}</p>
                   <p className="text-sm text-slate-500 mt-2">All time bookings</p>
                 </div>
                 <div className="w-16 h-16 bg-gradient-to-br from-[#2A7DE1] to-[#1E5FBC] rounded-2xl flex items-center justify-center shadow-lg">
@@ -19,12 +19,18 @@ api.interceptors.request.use(
   }
 );
 
+const idempotent = (key) => (key ? { headers: { 'Idempotency-Key': key } } : undefined);
+
 export const authAPI = {
   register: (data) => api.post('/auth/register', data),
   login: (data) => api.post('/auth/login', data),
   getMe: () => api.get('/auth/me'),
 };
 
+export const dashboardAPI = {
+  get: (limit) => api.get('/dashboard', { params: { limit } }),
+};
+
 export const testsAPI = {
   getAll: (category) => api.get('/tests', { params: { category } }),
   create: (data) => api.post('/tests', data),
@@ -34,6 +40,8 @@ export const testsAPI = {
 
 export const packagesAPI = {
   getAll: () => api.get('/packages'),
+  getExpanded: () => api.get('/packages/expanded'),
+  getExpandedById: (id) => api.get(`/packages/${id}/expanded`),
   create: (data) => api.post('/packages', data),
   update: (id, data) => api.put(`/packages/${id}`, data),
   delete: (id) => api.delete(`/packages/${id}`),
@@ -46,16 +54,24 @@ export const membershipsAPI = {
   delete: (id) => api.delete(`/memberships/${id}`),
 };
 
+export const pricingAPI = {
+  quote: (items, homeCollection = false) => api.post('/pricing/quote', { items, home_collection: homeCollection }),
+};
+
 export const appointmentsAPI = {
-  create: (data) => api.post('/appointments', data),
+  create: (data, idempotencyKey) => api.post('/appointments', data, idempotent(idempotencyKey)),
   getMy: () => api.get('/appointments'),
   getAll: () => api.get('/appointments/all'),
   update: (id, data) => api.put(`/appointments/${id}`, data),
   getSlots: (date) => api.get('/appointments/slots', { params: { date } }),
+  getNextSlots: (date, after, count = 3) => api.get('/appointments/slots/next', { params: { date, after, count } }),
+  joinWaitlist: (data) => api.post('/appointments/waitlist', data),
+  getWaitlist: () => api.get('/appointments/waitlist'),
+  leaveWaitlist: (id) => api.delete(`/appointments/waitlist/${id}`),
 };
 
 export const paymentsAPI = {
-  createOrder: (data) => api.post('/payments/create-order', data),
+  createOrder: (data, idempotencyKey) => api.post('/payments/create-order', data, idempotent(idempotencyKey)),
   verify: (data) => api.post('/payments/verify', data),
   getHistory: () => api.get('/payments/history'),
 };